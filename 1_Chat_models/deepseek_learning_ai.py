@@ -1,42 +1,77 @@
-from dotenv import load_dotenv
 import os
-from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
-from langchain_openai import ChatOpenAI
-
-# Load .env variables
-load_dotenv()
-api_key = os.getenv("OPENROUTER_API_KEY")
-
-if not api_key:
-    api_key = input("Please enter your OpenRouter API key: ")
-    os.environ["OPENROUTER_API_KEY"] = api_key
-
-# Setup OpenRouter + DeepSeek
-model = ChatOpenAI(
-    model="openai/gpt-3.5-turbo",  # Using GPT-3.5-turbo through OpenRouter
-    openai_api_key=api_key,
-    openai_api_base="https://openrouter.ai/api/v1",
-    temperature=0.7,
-    max_tokens=256
-)
-
-# Initial system message
-chat_history = [
-    SystemMessage(content="You are a helpful AI assistant.")
-]
-
-# Chat loop
-while True:
-    try:
-        user_input = input("You: ")
+import sys
+from functools import lru_cache
+
+# Make the shared helpers in the repository root importable
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def get_api_key():
+    """Returns the OpenRouter API key from .env, asking for it if it isn't set."""
+    from dotenv import load_dotenv
+
+    # Load .env variables
+    load_dotenv()
+    api_key = os.getenv("OPENROUTER_API_KEY")
+
+    if not api_key:
+        api_key = input("Please enter your OpenRouter API key: ")
+        os.environ["OPENROUTER_API_KEY"] = api_key
+    return api_key
+
+
+@lru_cache(maxsize=None)
+def get_model():
+    """Creates the chat model on first use; langchain_openai is only imported then."""
+    from langchain_openai import ChatOpenAI
+
+    from resilient_runnable import ResilientRunnable
+
+    # Setup OpenRouter + DeepSeek
+    # ResilientRunnable owns retries, so the client's own retries are turned off
+    return ResilientRunnable(ChatOpenAI(
+        model="openai/gpt-3.5-turbo",  # Using GPT-3.5-turbo through OpenRouter
+        openai_api_key=get_api_key(),
+        openai_api_base=os.getenv("OPENROUTER_API_BASE", "https://openrouter.ai/api/v1"),
+        temperature=0.7,
+        max_tokens=256,
+        max_retries=0
+    ), endpoint="openrouter")
+
+
+def main():
+    from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
+
+    model = get_model()
+
+    # Initial system message
+    chat_history = [
+        SystemMessage(content="You are a helpful AI assistant.")
+    ]
+
+    # Chat loop
+    while True:
+        try:
+            user_input = input("You: ")
+        except (EOFError, KeyboardInterrupt):
+            break
         if user_input.lower() == "exit":
             break
 
         chat_history.append(HumanMessage(content=user_input))
-        response = model.invoke(chat_history)
+        try:
+            response = model.invoke(chat_history)
+        except KeyboardInterrupt:
+            break
+        except Exception as e:
+            # Transient failures were already retried, so drop the unanswered message and keep chatting
+            chat_history.pop()
+            print(f"An error occurred: {str(e)}")
+            print("Please make sure your API key is correct and try again.")
+            continue
         chat_history.append(AIMessage(content=response.content))
         print("AI:", response.content)
-    except Exception as e:
-        print(f"An error occurred: {str(e)}")
-        print("Please make sure your API key is correct and try again.")
-        break
+
+
+if __name__ == "__main__":
+    main()
@@ -1,46 +1,73 @@
-from dotenv import load_dotenv
 import os
-from langchain.prompts import ChatMessagePromptTemplate
-from langchain_openai import ChatOpenAI
-
-# Load .env variables
-load_dotenv()
-api_key = os.getenv("OPENROUTER_API_KEY")
-
-if not api_key:
-    api_key = input("Please enter your OpenRouter API key: ")
-    os.environ["OPENROUTER_API_KEY"] = api_key
-
-# Setup OpenRouter + GPT-3.5-turbo
-model = ChatOpenAI(
-    model="gpt-3.5-turbo",
-    openai_api_key=api_key,
-    openai_api_base="https://openrouter.ai/api/v1",
-    temperature=0.7,
-    max_tokens=256,
-  
-)
-
-print("---- Simple Joke Template ----")
-# Part 1: Creating a prompt template
-template = "Tell me a joke {topic}"
-prompt_template = ChatMessagePromptTemplate.from_template(template, role="user")
-
-prompt = prompt_template.format(topic="why was the cat sitting on the computer?")
-response = model.invoke([prompt])
-print("\nJoke:", response.content)
-
-print("\n---- Prompt with Multiple Placeholders ----")
-template_multiple = """You are a helpful assistant.
+import sys
+from functools import lru_cache
+
+# Make the shared helpers in the repository root importable
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def get_api_key():
+    """Returns the OpenRouter API key from .env, asking for it if it isn't set."""
+    from dotenv import load_dotenv
+
+    # Load .env variables
+    load_dotenv()
+    api_key = os.getenv("OPENROUTER_API_KEY")
+
+    if not api_key:
+        api_key = input("Please enter your OpenRouter API key: ")
+        os.environ["OPENROUTER_API_KEY"] = api_key
+    return api_key
+
+
+@lru_cache(maxsize=None)
+def get_model():
+    """Creates the chat model on first use."""
+    from langchain_openai import ChatOpenAI
+
+    from resilient_runnable import ResilientRunnable
+
+    # Setup OpenRouter + GPT-3.5-turbo
+    # ResilientRunnable owns retries, so the client's own retries are turned off
+    return ResilientRunnable(ChatOpenAI(
+        model="gpt-3.5-turbo",
+        openai_api_key=get_api_key(),
+        openai_api_base=os.getenv("OPENROUTER_API_BASE", "https://openrouter.ai/api/v1"),
+        temperature=0.7,
+        max_tokens=256,
+        max_retries=0,
+    ), endpoint="openrouter")
+
+
+def main():
+    from langchain.prompts import ChatMessagePromptTemplate
+
+    model = get_model()
+
+    print("---- Simple Joke Template ----")
+    # Part 1: Creating a prompt template
+    template = "Tell me a joke {topic}"
+    prompt_template = ChatMessagePromptTemplate.from_template(template, role="user")
+
+    prompt = prompt_template.format(topic="why was the cat sitting on the computer?")
+    response = model.invoke([prompt])
+    print("\nJoke:", response.content)
+
+    print("\n---- Prompt with Multiple Placeholders ----")
+    template_multiple = """You are a helpful assistant.
 Human: Tell me a {adjective} short story about a {animal}
 Assistant: """
 
-prompt_multiple = ChatMessagePromptTemplate.from_template(template_multiple, role="user")
-# Use format() instead of invoke()
-prompt = prompt_multiple.format(
-    adjective="funny",
-    animal="cat"
-)
+    prompt_multiple = ChatMessagePromptTemplate.from_template(template_multiple, role="user")
+    # Use format() instead of invoke()
+    prompt = prompt_multiple.format(
+        adjective="funny",
+        animal="cat"
+    )
+
+    result = model.invoke([prompt])
+    print("\nShort Story:", result.content)
+
 
-result = model.invoke([prompt])
-print("\nShort Story:", result.content)
+if __name__ == "__main__":
+    main()
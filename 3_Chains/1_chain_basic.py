@@ -1,39 +1,67 @@
-from dotenv import load_dotenv
 import os
-from langchain.prompts import ChatPromptTemplate
-from langchain_openai import ChatOpenAI
-from langchain_core.output_parsers import StrOutputParser
+import sys
+from functools import lru_cache
 
-# Load .env variables
-load_dotenv()
-api_key = os.getenv("OPENROUTER_API_KEY")
+# Make the shared helpers in the repository root importable
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-if not api_key:
-    api_key = input("Please enter your OpenRouter API key: ")
-    os.environ["OPENROUTER_API_KEY"] = api_key
 
-# Setup OpenRouter + GPT-3.5-turbo
-model = ChatOpenAI(
-    model="gpt-3.5-turbo",
-    openai_api_key=api_key,
-    openai_api_base="https://openrouter.ai/api/v1",
-    temperature=0.7,
-    max_tokens=256,
+def get_api_key():
+    """Returns the OpenRouter API key from .env, asking for it if it isn't set."""
+    from dotenv import load_dotenv
 
-)
+    # Load .env variables
+    load_dotenv()
+    api_key = os.getenv("OPENROUTER_API_KEY")
 
-# define prompt templates
-prompt_tempelate = ChatPromptTemplate.from_messages(
-    [
-        ("system", "You are a comedian who tells jokes about {topic}"),
-        ("human", "Tell me a {joke_count} jokes.")
-    ]
-)
+    if not api_key:
+        api_key = input("Please enter your OpenRouter API key: ")
+        os.environ["OPENROUTER_API_KEY"] = api_key
+    return api_key
 
 
-# Create the combined chain using Langchain Expression Language (LCEL)
-chain = prompt_tempelate | model | StrOutputParser()
+@lru_cache(maxsize=None)
+def get_model():
+    """Creates the chat model on first use."""
+    from langchain_openai import ChatOpenAI
 
-result= chain.invoke({"topic": "lawyers", "joke_count": 3})
+    from resilient_runnable import ResilientRunnable
 
-print(result)
+    # Setup OpenRouter + GPT-3.5-turbo
+    # ResilientRunnable owns retries, so the client's own retries are turned off
+    return ResilientRunnable(ChatOpenAI(
+        model="gpt-3.5-turbo",
+        openai_api_key=get_api_key(),
+        openai_api_base=os.getenv("OPENROUTER_API_BASE", "https://openrouter.ai/api/v1"),
+        temperature=0.7,
+        max_tokens=256,
+        max_retries=0,
+    ), endpoint="openrouter")
+
+
+@lru_cache(maxsize=None)
+def get_chain():
+    """Builds the joke chain on first use."""
+    from langchain.prompts import ChatPromptTemplate
+    from langchain_core.output_parsers import StrOutputParser
+
+    # define prompt templates
+    prompt_tempelate = ChatPromptTemplate.from_messages(
+        [
+            ("system", "You are a comedian who tells jokes about {topic}"),
+            ("human", "Tell me a {joke_count} jokes.")
+        ]
+    )
+
+    # Create the combined chain using Langchain Expression Language (LCEL)
+    return prompt_tempelate | get_model() | StrOutputParser()
+
+
+def main():
+    result = get_chain().invoke({"topic": "lawyers", "joke_count": 3})
+
+    print(result)
+
+
+if __name__ == "__main__":
+    main()
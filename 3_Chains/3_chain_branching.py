@@ -1,83 +1,114 @@
-from dotenv import load_dotenv
 import os
-from langchain.prompts import ChatPromptTemplate
-from langchain_openai import ChatOpenAI
-from langchain_core.output_parsers import StrOutputParser
-from langchain.schema.runnable import RunnableBranch
-
-# Load .env variables
-load_dotenv()
-api_key = os.getenv("OPENROUTER_API_KEY")
-
-if not api_key:
-    api_key = input("Please enter your OpenRouter API key: ")
-    os.environ["OPENROUTER_API_KEY"] = api_key
-
-# Setup OpenRouter + GPT-3.5-turbo
-model = ChatOpenAI(
-    model="gpt-3.5-turbo",
-    openai_api_key=api_key,
-    openai_api_base="https://openrouter.ai/api/v1",
-    temperature=0.7,
-    max_tokens=256,
-
-)
-
-# define prompt templates for different feedback types
-positive_feedback_template = ChatPromptTemplate.from_messages([
-    ("system", "You are a helpful assistant."),
-    ("human",
-     "Generate a thank you note for  this positive feedback :{feedback}"),
-])
-
-negative_feedback_template = ChatPromptTemplate.from_messages([
-    ("system", "You are a helpful assistant."),
-    ("human",
-     "Generate a response addressing this negative feedback :{feedback}"),
-])
-
-neutral_feedback_template = ChatPromptTemplate.from_messages([
-    ("system", "You are a helpful assistant."),
-    ("human",
-     "Generate a request for more details for this neutral feedback :{feedback}"),
-])
-
-escalate_feedback_template = ChatPromptTemplate.from_messages([
-    ("system", "You are a helpful assistant."),
-    ("human",
-     "Generate a message to escalate thsi feedback to a human agent :{feedback}"),
-])
-
-# Define the feedback classification template
-classification_template = ChatPromptTemplate.from_messages([
-    ("system", "You are a helpful assistant."),
-    ("human",
-     "Classify the sentiment of this feedback as positive, negative  neutral ,or escalate :{feedback}"),
-])
-# Define the runnable branches for handling feedback
-
-branches = RunnableBranch(
-    (
-        lambda x: "positive" in x,
-        positive_feedback_template | model | StrOutputParser()
-    ),
-    (
-        lambda x: "negative" in x,
-        negative_feedback_template | model | StrOutputParser()
-    ),
-    (
-        lambda x: "neutral" in x,
-        neutral_feedback_template | model | StrOutputParser()
-    ),
-    escalate_feedback_template | model | StrOutputParser()
-)
-
-# Create the classification chain
-classification_chain= classification_template | model | StrOutputParser()
-
-#Combine classification and response generation into one chain
-chain = classification_chain | branches
-
-review= "The product is terrible . It broke after just one use and the quality is very poor."
-result= chain.invoke({"feedback": review})
-print(result)
\ No newline at end of file
+import sys
+from functools import lru_cache
+
+# Make the shared helpers in the repository root importable
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def get_api_key():
+    """Returns the OpenRouter API key from .env, asking for it if it isn't set."""
+    from dotenv import load_dotenv
+
+    # Load .env variables
+    load_dotenv()
+    api_key = os.getenv("OPENROUTER_API_KEY")
+
+    if not api_key:
+        api_key = input("Please enter your OpenRouter API key: ")
+        os.environ["OPENROUTER_API_KEY"] = api_key
+    return api_key
+
+
+@lru_cache(maxsize=None)
+def get_model():
+    """Creates the chat model on first use."""
+    from langchain_openai import ChatOpenAI
+
+    from resilient_runnable import ResilientRunnable
+
+    # Setup OpenRouter + GPT-3.5-turbo
+    # ResilientRunnable owns retries, so the client's own retries are turned off
+    return ResilientRunnable(ChatOpenAI(
+        model="gpt-3.5-turbo",
+        openai_api_key=get_api_key(),
+        openai_api_base=os.getenv("OPENROUTER_API_BASE", "https://openrouter.ai/api/v1"),
+        temperature=0.7,
+        max_tokens=256,
+        max_retries=0,
+    ), endpoint="openrouter")
+
+
+@lru_cache(maxsize=None)
+def get_chain():
+    """Builds the feedback classification and response chain on first use."""
+    from langchain.prompts import ChatPromptTemplate
+    from langchain_core.output_parsers import StrOutputParser
+    from langchain.schema.runnable import RunnableBranch
+
+    model = get_model()
+
+    # define prompt templates for different feedback types
+    positive_feedback_template = ChatPromptTemplate.from_messages([
+        ("system", "You are a helpful assistant."),
+        ("human",
+         "Generate a thank you note for  this positive feedback :{feedback}"),
+    ])
+
+    negative_feedback_template = ChatPromptTemplate.from_messages([
+        ("system", "You are a helpful assistant."),
+        ("human",
+         "Generate a response addressing this negative feedback :{feedback}"),
+    ])
+
+    neutral_feedback_template = ChatPromptTemplate.from_messages([
+        ("system", "You are a helpful assistant."),
+        ("human",
+         "Generate a request for more details for this neutral feedback :{feedback}"),
+    ])
+
+    escalate_feedback_template = ChatPromptTemplate.from_messages([
+        ("system", "You are a helpful assistant."),
+        ("human",
+         "Generate a message to escalate thsi feedback to a human agent :{feedback}"),
+    ])
+
+    # Define the feedback classification template
+    classification_template = ChatPromptTemplate.from_messages([
+        ("system", "You are a helpful assistant."),
+        ("human",
+         "Classify the sentiment of this feedback as positive, negative  neutral ,or escalate :{feedback}"),
+    ])
+    # Define the runnable branches for handling feedback
+
+    branches = RunnableBranch(
+        (
+            lambda x: "positive" in x,
+            positive_feedback_template | model | StrOutputParser()
+        ),
+        (
+            lambda x: "negative" in x,
+            negative_feedback_template | model | StrOutputParser()
+        ),
+        (
+            lambda x: "neutral" in x,
+            neutral_feedback_template | model | StrOutputParser()
+        ),
+        escalate_feedback_template | model | StrOutputParser()
+    )
+
+    # Create the classification chain
+    classification_chain = classification_template | model | StrOutputParser()
+
+    #Combine classification and response generation into one chain
+    return classification_chain | branches
+
+
+def main():
+    review = "The product is terrible . It broke after just one use and the quality is very poor."
+    result = get_chain().invoke({"feedback": review})
+    print(result)
+
+
+if __name__ == "__main__":
+    main()
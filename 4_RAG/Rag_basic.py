@@ -1,18 +1,4 @@
-from dotenv import load_dotenv
 import os
-from langchain.text_splitter import CharacterTextSplitter
-from langchain_community.document_loaders import TextLoader
-from langchain_community.vectorstores import Chroma
-from langchain_openai import OpenAIEmbeddings
-
-# Load environment variables
-load_dotenv()
-api_key = os.getenv("OPENROUTER_API_KEY")
-
-if not api_key:
-    api_key = input("Please enter your OpenRouter API key: ")
-    os.environ["OPENROUTER_API_KEY"] = api_key
-
 
 # Define the directory containing the textfile and the presistent directory
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -20,10 +6,27 @@ file_path = os.path.join(current_dir, "books", "odyssey.txt")
 presistent_directory = os.path.join(current_dir, "db", "chroma_db")
 
 
-# check if the Chroma vector store aleady exists
+def get_api_key():
+    """Returns the OpenRouter API key from .env, asking for it if it isn't set."""
+    from dotenv import load_dotenv
+
+    # Load environment variables
+    load_dotenv()
+    api_key = os.getenv("OPENROUTER_API_KEY")
+
+    if not api_key:
+        api_key = input("Please enter your OpenRouter API key: ")
+        os.environ["OPENROUTER_API_KEY"] = api_key
+    return api_key
+
 
-if not os.path.exists(presistent_directory):
-    print("Presistent directory does not exist. Initializing vector store...")
+def build_vector_store():
+    """Splits the book, embeds the chunks and writes them to the Chroma store."""
+    from langchain.text_splitter import CharacterTextSplitter
+    from langchain_community.document_loaders import TextLoader
+    from langchain_openai import OpenAIEmbeddings
+
+    from bulk_loader import bulk_load
 
     # Ensure the text file exist
     if not os.path.exists(file_path):
@@ -43,7 +46,7 @@ if not os.path.exists(presistent_directory):
     print("\n---Creating embeddings---")
     embeddings = OpenAIEmbeddings(
         model="text-embedding-3-small",  # Using a model supported by OpenRouter
-        api_key=api_key,
+        api_key=get_api_key(),
         base_url="https://openrouter.ai/api/v1",
         default_headers={
             "HTTP-Referer": "http://localhost:8000",
@@ -51,9 +54,20 @@ if not os.path.exists(presistent_directory):
         }
     )
     print("\n--Creating vector store---")
-    db = Chroma.from_documents(
-        docs, embeddings, persist_directory=presistent_directory
-    )
+    # Write the vectors in checkpointed batches so a crash resumes instead of leaving a half-written store
+    return bulk_load(docs, embeddings, presistent_directory, batch_size=64)
+
+
+def main():
+    from bulk_loader import is_store_complete
+
+    # check if the Chroma vector store was completely written by an earlier run
+    if not is_store_complete(presistent_directory):
+        print("Vector store is missing or incomplete. Initializing vector store...")
+        build_vector_store()
+    else:
+        print("Vector store already exists. NO need to initialize")
+
 
-else:
-    print("Vector store already exists. NO need to initialize")
+if __name__ == "__main__":
+    main()
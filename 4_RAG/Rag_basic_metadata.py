@@ -1,22 +1,50 @@
 import os
+import time
 
-from langchain.text_splitter import CharacterTextSplitter
-from langchain_community.document_loaders import TextLoader
-from langchain_community.vectorstores import Chroma
-from langchain_huggingface import HuggingFaceEmbeddings
+# Metadata key used to shard the vector store (one collection per book).
+# Set it to None to keep every chunk in a single collection.
+partition_key = "source"
+
+# Chunks are embedded and written in checkpointed batches so an interrupted run resumes.
+# With defer_index the HNSW index is only built once every batch has been embedded.
+batch_size = 64
+defer_index = False
+
+# Chunks whose estimated Jaccard similarity to an earlier chunk reaches this threshold
+# are merged into it before embedding (overlapping editions of the same book)
+dedup_threshold = 0.8
+
+# Keep only a byte-range reference to each chunk's text in the vector store
+# and read the text back from the book files at retrieval time
+compact_chunks = True
 
 # Define the directory containing the text files and the persistent directory
 current_dir = os.path.dirname(os.path.abspath(__file__))
 books_dir = os.path.join(current_dir, "books")
 db_dir = os.path.join(current_dir, "db")
-persistent_directory = os.path.join(db_dir, "chroma_db_with_metadata")
+if partition_key:
+    persistent_directory = os.path.join(db_dir, f"chroma_db_partitioned_by_{partition_key}")
+else:
+    persistent_directory = os.path.join(db_dir, "chroma_db_with_metadata")
+
 
-print(f"Books directory: {books_dir}")
-print(f"Persistent directory: {persistent_directory}")
+def is_vector_store_complete():
+    """Returns True if an earlier run completely wrote the Chroma vector store."""
+    from bulk_loader import is_store_complete
+    from partitioned_store import is_partitioned_store_complete
 
-# Check if the Chroma vector store already exists
-if not os.path.exists(persistent_directory):
-    print("Persistent directory does not exist. Initializing vector store...")
+    if partition_key:
+        return is_partitioned_store_complete(persistent_directory)
+    return is_store_complete(persistent_directory)
+
+
+def load_book_chunks():
+    """Reads every book, splits it into chunks tagged with their source and merges near-duplicates."""
+    from langchain.text_splitter import CharacterTextSplitter
+    from langchain_community.document_loaders import TextLoader
+
+    from dedup import DedupReport, MinHashDeduplicator
+    from partitioned_store import partition_documents
 
     # Ensure the books directory exists
     if not os.path.exists(books_dir):
@@ -46,18 +74,74 @@ if not os.path.exists(persistent_directory):
     print("\n--- Document Chunks Information ---")
     print(f"Number of document chunks: {len(docs)}")
 
+    # Merge near-duplicate chunks so they are embedded and indexed only once
+    # The kept chunk counts the copies merged into it under "duplicate_count", and
+    # the other books they came from under "duplicate_sources"
+    print("\n--- Removing near-duplicate chunks ---")
+    deduplicator = MinHashDeduplicator(threshold=dedup_threshold, mode="merge")
+    if partition_key:
+        # Only merge within a partition: a chunk merged into another book's shard
+        # would no longer be found by a query filtered on its own partition
+        unique_docs = []
+        total = kept = chars_removed = 0
+        for partition_docs in partition_documents(docs, partition_key).values():
+            partition_docs, report = deduplicator.deduplicate(partition_docs)
+            unique_docs.extend(partition_docs)
+            total, kept, chars_removed = total + report.total, kept + report.kept, chars_removed + report.chars_removed
+        docs, dedup_report = unique_docs, DedupReport(total, kept, chars_removed)
+    else:
+        docs, dedup_report = deduplicator.deduplicate(docs)
+    print(f"Number of unique document chunks: {len(docs)}")
+    return docs, dedup_report
+
+
+def build_vector_store():
+    """Embeds the book chunks and writes them to the (partitioned) Chroma store."""
+    from bulk_loader import bulk_load
+    from chunk_store import ChunkStore
+    from embedding_service import get_embeddings
+    from partitioned_store import build_partitioned_store
+
+    docs, dedup_report = load_book_chunks()
+
+    if compact_chunks:
+        # Chunks found verbatim in their book are stored as (path, byte offset, length, hash)
+        chunk_store = ChunkStore(current_dir, persistent_directory)
+        docs = chunk_store.add(docs, path_of=lambda doc: os.path.join("books", doc.metadata["source"]))
+
     # Create embeddings using HuggingFace's sentence-transformers
     print("\n--- Creating embeddings ---")
-    embeddings = HuggingFaceEmbeddings(
-        model_name="sentence-transformers/all-mpnet-base-v2"
-    )
+    # Use the resident embedding service (embedding_service.py) if it is running,
+    # otherwise load the model in this process
+    embeddings = get_embeddings("sentence-transformers/all-mpnet-base-v2")
     print("\n--- Finished creating embeddings ---")
 
     # Create the vector store and persist it
     print("\n--- Creating and persisting vector store ---")
-    db = Chroma.from_documents(
-        docs, embeddings, persist_directory=persistent_directory)
+    start_time = time.perf_counter()
+    if partition_key:
+        build_partitioned_store(
+            docs, embeddings, persistent_directory, partition_key=partition_key,
+            batch_size=batch_size, defer_index=defer_index)
+    else:
+        bulk_load(
+            docs, embeddings, persistent_directory,
+            batch_size=batch_size, defer_index=defer_index)
     print("\n--- Finished creating and persisting vector store ---")
-else:
-    print("Vector store already exists. No need to initialize.")
+    print(dedup_report.summary(
+        embedding_seconds=time.perf_counter() - start_time, dimension=768))
+
+
+def main():
+    print(f"Books directory: {books_dir}")
+    print(f"Persistent directory: {persistent_directory}")
+
+    if not is_vector_store_complete():
+        print("Vector store is missing or incomplete. Initializing vector store...")
+        build_vector_store()
+    else:
+        print("Vector store already exists. No need to initialize.")
+
 
+if __name__ == "__main__":
+    main()
@@ -1,54 +1,14 @@
 import os
+import sys
+from functools import lru_cache
 
-from dotenv import load_dotenv
-from langchain.chains import create_history_aware_retriever, create_retrieval_chain
-from langchain.chains.combine_documents import create_stuff_documents_chain
-from langchain_core.messages import HumanMessage, SystemMessage
-from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain_huggingface import HuggingFaceEmbeddings, HuggingFaceEndpoint
-from langchain_chroma import Chroma
-
-# Load environment variables from .env
-load_dotenv()
-
-# Get HuggingFace API token
-hf_token = os.getenv("HUGGINGFACEHUB_API_TOKEN")
-if not hf_token:
-    print("Error: HUGGINGFACEHUB_API_TOKEN not found in .env file")
-    hf_token = input("Please enter your HuggingFace API token: ")
-    os.environ["HUGGINGFACEHUB_API_TOKEN"] = hf_token
-
-# Define the persistent directory
-current_dir = os.path.dirname(os.path.abspath(__file__))
-persistent_directory = os.path.join(current_dir, "db", "chroma_db_with_metadata")
-
-# Define the embedding model using sentence-transformers
-embeddings = HuggingFaceEmbeddings(
-    model_name="sentence-transformers/all-mpnet-base-v2"
-)
+# Make the shared helpers in the repository root importable
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-# Load the existing vector store with the embedding function
-db = Chroma(persist_directory=persistent_directory, embedding_function=embeddings)
+# Read the store Rag_basic_metadata.py writes, partitioned or not
+from Rag_basic_metadata import partition_key, persistent_directory
 
-# Create a retriever for querying the vector store
-# `search_type` specifies the type of search (e.g., similarity)
-# `search_kwargs` contains additional arguments for the search (e.g., number of results to return)
-retriever = db.as_retriever(
-    search_type="similarity",
-    search_kwargs={"k": 3},
-)
-
-# Create a HuggingFace model
-llm = HuggingFaceEndpoint(
-    endpoint_url="https://api-inference.huggingface.co/models/google/flan-t5-large",
-    task="text2text-generation",
-    temperature=0.7,
-    max_length=512,
-    do_sample=True,
-    top_k=50,
-    top_p=0.95,
-    huggingfacehub_api_token=hf_token
-)
+current_dir = os.path.dirname(os.path.abspath(__file__))
 
 # Contextualize question prompt
 # This system prompt helps the AI understand that it should reformulate the question
@@ -61,21 +21,6 @@ contextualize_q_system_prompt = (
     "reformulate it if needed and otherwise return it as is."
 )
 
-# Create a prompt template for contextualizing questions
-contextualize_q_prompt = ChatPromptTemplate.from_messages(
-    [
-        ("system", contextualize_q_system_prompt),
-        MessagesPlaceholder("chat_history"),
-        ("human", "{input}"),
-    ]
-)
-
-# Create a history-aware retriever
-# This uses the LLM to help reformulate the question based on chat history
-history_aware_retriever = create_history_aware_retriever(
-    llm, retriever, contextualize_q_prompt
-)
-
 # Answer question prompt
 # This system prompt helps the AI understand that it should provide concise answers
 # based on the retrieved context and indicates what to do if the answer is unknown
@@ -89,25 +34,209 @@ qa_system_prompt = (
     "{context}"
 )
 
-# Create a prompt template for answering questions
-qa_prompt = ChatPromptTemplate.from_messages(
-    [
-        ("system", qa_system_prompt),
-        MessagesPlaceholder("chat_history"),
-        ("human", "{input}"),
-    ]
-)
+# flan-t5-large only reads the first 512 input tokens and silently drops the rest
+model_max_input_tokens = 512
+# Input tokens kept free for retrieved context; the oldest chat turns are dropped to make room
+min_context_tokens = 200
+
+
+@lru_cache(maxsize=None)
+def load_environment():
+    from dotenv import load_dotenv
+
+    # Load environment variables from .env
+    load_dotenv()
+
+
+def get_hf_token():
+    """Returns the HuggingFace API token from .env, asking for it if it isn't set."""
+    load_environment()
+
+    # Get HuggingFace API token
+    hf_token = os.getenv("HUGGINGFACEHUB_API_TOKEN")
+    if not hf_token:
+        print("Error: HUGGINGFACEHUB_API_TOKEN not found in .env file")
+        hf_token = input("Please enter your HuggingFace API token: ")
+        os.environ["HUGGINGFACEHUB_API_TOKEN"] = hf_token
+    return hf_token
+
+
+@lru_cache(maxsize=None)
+def get_embeddings():
+    # Define the embedding model using sentence-transformers
+    # Use the resident embedding service (embedding_service.py) if it is running,
+    # otherwise load the model in this process
+    from embedding_service import get_embeddings as load_embeddings
+
+    return load_embeddings("sentence-transformers/all-mpnet-base-v2")
+
+
+@lru_cache(maxsize=None)
+def get_retriever():
+    """Returns the retriever over the book chunks, with their text filled in."""
+    from chunk_store import ChunkStore
+
+    load_environment()
+
+    # Chunks written with compact_chunks only hold a reference to their text,
+    # so the chunk store fills it in from the book files
+    chunk_store = ChunkStore(current_dir, persistent_directory)
+
+    # Set SERVING_INDEX to a directory written by `mmap_index.py export` to serve
+    # the store from memory-mapped snapshots shared by every worker process
+    serving_index = os.getenv("SERVING_INDEX")
+    if serving_index:
+        from mmap_retriever import MmapRetriever
+
+        # Newly exported snapshots are picked up without restarting
+        return MmapRetriever(serving_dir=serving_index, embeddings=get_embeddings(), k=3) | chunk_store.hydrator()
+
+    if not os.path.exists(persistent_directory):
+        raise FileNotFoundError(
+            f"The directory {persistent_directory} does not exist. Run Rag_basic_metadata.py first."
+        )
 
-# Create a chain to combine documents for question answering
-# `create_stuff_documents_chain` feeds all retrieved context into the LLM
-question_answer_chain = create_stuff_documents_chain(llm, qa_prompt)
+    if partition_key:
+        from partitioned_store import load_partitioned_store
 
-# Create a retrieval chain that combines the history-aware retriever and the question answering chain
-rag_chain = create_retrieval_chain(history_aware_retriever, question_answer_chain)
+        # One collection per partition, searched in parallel and merged by distance
+        return load_partitioned_store(persistent_directory, get_embeddings(), k=3) | chunk_store.hydrator()
+
+    from langchain_chroma import Chroma
+
+    # Load the existing vector store with the embedding function
+    db = Chroma(persist_directory=persistent_directory, embedding_function=get_embeddings())
+
+    # Create a retriever for querying the vector store
+    # `search_type` specifies the type of search (e.g., similarity)
+    # `search_kwargs` contains additional arguments for the search (e.g., number of results to return)
+    return db.as_retriever(
+        search_type="similarity",
+        search_kwargs={"k": 3},
+    ) | chunk_store.hydrator()
+
+
+@lru_cache(maxsize=None)
+def get_llm():
+    load_environment()
+
+    # Create a HuggingFace model
+    if os.getenv("LLM_BACKEND") == "local":
+        from local_llm import LocalLLM
+
+        # Run flan-t5-large on this machine's CPU instead of the inference endpoint
+        return LocalLLM(
+            model_id="google/flan-t5-large",
+            task="text2text-generation",
+            max_new_tokens=256,
+            temperature=0.7,
+            do_sample=True,
+            top_k=50,
+            top_p=0.95,
+        )
+
+    from langchain_huggingface import HuggingFaceEndpoint
+
+    from resilient_runnable import ResilientRunnable
+
+    # ResilientRunnable hedges slow calls, retries 429/5xx with backoff and stops calling a failing endpoint
+    return ResilientRunnable(HuggingFaceEndpoint(
+        endpoint_url="https://api-inference.huggingface.co/models/google/flan-t5-large",
+        task="text2text-generation",
+        temperature=0.7,
+        max_length=512,
+        do_sample=True,
+        top_k=50,
+        top_p=0.95,
+        huggingfacehub_api_token=get_hf_token()
+    ), endpoint="huggingface/google/flan-t5-large")
+
+
+@lru_cache(maxsize=None)
+def get_rag_chain():
+    """Builds the history-aware retrieval chain on first use."""
+    from langchain.chains import create_history_aware_retriever, create_retrieval_chain
+    from langchain.chains.combine_documents import create_stuff_documents_chain
+    from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+    from langchain_core.runnables import RunnablePassthrough
+
+    from context_packing import ContextPacker, huggingface_token_counter
+
+    llm = get_llm()
+
+    # Create a context packer that keeps only the retrieved sentences most relevant to the question
+    # It reuses the retrieval embeddings and caches sentence embeddings across questions
+    context_packer = ContextPacker(
+        get_embeddings(), token_counter=huggingface_token_counter("google/flan-t5-large")
+    )
+
+    # Create a prompt template for contextualizing questions
+    contextualize_q_prompt = ChatPromptTemplate.from_messages(
+        [
+            ("system", contextualize_q_system_prompt),
+            MessagesPlaceholder("chat_history"),
+            ("human", "{input}"),
+        ]
+    )
+
+    # Create a history-aware retriever
+    # This uses the LLM to help reformulate the question based on chat history
+    history_aware_retriever = create_history_aware_retriever(
+        llm, get_retriever(), contextualize_q_prompt
+    )
+
+    # Create a prompt template for answering questions
+    qa_prompt = ChatPromptTemplate.from_messages(
+        [
+            ("system", qa_system_prompt),
+            MessagesPlaceholder("chat_history"),
+            ("human", "{input}"),
+        ]
+    )
+
+    def context_budget(chat_history, question):
+        # The context gets whatever the prompt, chat history and question leave of the model's input limit
+        prompt_without_context = qa_prompt.format(context="", chat_history=chat_history, input=question)
+        return model_max_input_tokens - context_packer.count_tokens(prompt_without_context)
+
+    def trim_history(inputs):
+        # Drop the oldest question/answer pairs until the prompt leaves room for the context
+        chat_history = list(inputs["chat_history"])
+        while context_budget(chat_history, inputs["input"]) < min_context_tokens:
+            if not chat_history:
+                raise ValueError(
+                    f"The question leaves less than {min_context_tokens} of the model's "
+                    f"{model_max_input_tokens} input tokens for context, please shorten it"
+                )
+            chat_history = chat_history[2:]
+        dropped = len(inputs["chat_history"]) - len(chat_history)
+        if dropped:
+            print(f"(Leaving the {dropped} oldest chat messages out to fit the model's input limit)")
+        return chat_history
+
+    def pack_context(inputs):
+        budget = context_budget(inputs["chat_history"], inputs["input"])
+        return context_packer.pack(inputs["input"], inputs["context"], max_tokens=budget)
+
+    # Create a chain to combine documents for question answering
+    # The retrieved chunks are packed into the token budget before
+    # `create_stuff_documents_chain` feeds them into the LLM
+    question_answer_chain = RunnablePassthrough.assign(context=pack_context) | create_stuff_documents_chain(
+        llm, qa_prompt
+    )
+
+    # Create a retrieval chain that combines the history-aware retriever and the question answering chain
+    # Both steps see the chat history trimmed to what fits next to the context
+    return RunnablePassthrough.assign(chat_history=trim_history) | create_retrieval_chain(
+        history_aware_retriever, question_answer_chain
+    )
 
 
 # Function to simulate a continual chat
 def continual_chat():
+    from langchain_core.messages import HumanMessage, SystemMessage
+
+    rag_chain = get_rag_chain()
     print("Start chatting with the AI! Type 'exit' to end the conversation.")
     chat_history = []  # Collect chat history here (a sequence of messages)
     while True:
@@ -115,7 +244,11 @@ def continual_chat():
         if query.lower() == "exit":
             break
         # Process the user's query through the retrieval chain
-        result = rag_chain.invoke({"input": query, "chat_history": chat_history})
+        try:
+            result = rag_chain.invoke({"input": query, "chat_history": chat_history})
+        except Exception as e:
+            print(f"An error occurred: {str(e)}")
+            continue
         # Display the AI's response
         print(f"AI: {result['answer']}")
         # Update the chat history
@@ -123,6 +256,10 @@ def continual_chat():
         chat_history.append(SystemMessage(content=result["answer"]))
 
 
+def main():
+    continual_chat()
+
+
 # Main function to start the continual chat
 if __name__ == "__main__":
-    continual_chat()
+    main()
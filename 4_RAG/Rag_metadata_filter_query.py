@@ -0,0 +1,63 @@
+import os
+from functools import lru_cache
+
+# Read the partitioned store Rag_basic_metadata.py writes
+from Rag_basic_metadata import persistent_directory
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+
+query = "How did Odysseus return home?"
+
+
+@lru_cache(maxsize=None)
+def get_retriever():
+    """Opens one Chroma collection per partition behind a single retriever."""
+    from embedding_service import get_embeddings
+    from partitioned_store import load_partitioned_store
+
+    if not os.path.exists(persistent_directory):
+        raise FileNotFoundError(
+            f"The directory {persistent_directory} does not exist. Run Rag_basic_metadata.py first."
+        )
+
+    # Define the embedding model using sentence-transformers
+    # Use the resident embedding service (embedding_service.py) if it is running,
+    # otherwise load the model in this process
+    embeddings = get_embeddings("sentence-transformers/all-mpnet-base-v2")
+    return load_partitioned_store(persistent_directory, embeddings, k=3)
+
+
+@lru_cache(maxsize=None)
+def get_chunk_store():
+    # Chunks written with compact_chunks only hold a reference to their text in the book files
+    from chunk_store import ChunkStore
+
+    return ChunkStore(current_dir, persistent_directory)
+
+
+def show_results(title, relevant_docs):
+    print(f"\n--- {title} ---")
+    for i, doc in enumerate(get_chunk_store().hydrate(relevant_docs), 1):
+        print(f"Document {i}:\n{doc.page_content}\n")
+        print(f"Source: {doc.metadata.get('source', 'Unknown')}\n")
+
+
+def main():
+    retriever = get_retriever()
+    print(f"Partitions: {', '.join(retriever.stores)}")
+
+    # A filter on the partition key is pushed down, so only that shard is searched
+    show_results(
+        "Scoped to one source",
+        retriever.invoke(query, filter={"source": "odyssey.txt"}),
+    )
+
+    # A multi-source filter fans out across the matching shards and merges their top-k
+    show_results(
+        "Across several sources",
+        retriever.invoke(query, filter={"source": {"$in": list(retriever.stores)}}),
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,69 +1,117 @@
 import os
-
-from dotenv import load_dotenv
-from langchain.text_splitter import CharacterTextSplitter
-from langchain_community.document_loaders import WebBaseLoader
-from langchain_community.vectorstores import Chroma
-from langchain_huggingface import HuggingFaceEmbeddings
-
-# Load environment variables from .env
-load_dotenv()
+import time
+from functools import lru_cache
 
 # Define the persistent directory
 current_dir = os.path.dirname(os.path.abspath(__file__))
 db_dir = os.path.join(current_dir, "db")
 persistent_directory = os.path.join(db_dir, "chroma_db_apple_hf")
 
-# Step 1: Scrape the content from apple.com using WebBaseLoader
-# WebBaseLoader loads web pages and extracts their content
+# Web pages to scrape into the vector store
 urls = ["https://www.apple.com/"]
 
-# Create a loader for web content
-loader = WebBaseLoader(urls)
-documents = loader.load()
-
-# Step 2: Split the scraped content into chunks
-# CharacterTextSplitter splits the text into smaller chunks
-text_splitter = CharacterTextSplitter(chunk_size=1000, chunk_overlap=0)
-docs = text_splitter.split_documents(documents)
-
-# Display information about the split documents
-print("\n--- Document Chunks Information ---")
-print(f"Number of document chunks: {len(docs)}")
-print(f"Sample chunk:\n{docs[0].page_content}\n")
-
-# Step 3: Create embeddings for the document chunks
-# HuggingFaceEmbeddings turns text into numerical vectors that capture semantic meaning
-embeddings = HuggingFaceEmbeddings(
-    model_name="sentence-transformers/all-mpnet-base-v2"
-)
-
-# Step 4: Create and persist the vector store with the embeddings
-# Chroma stores the embeddings for efficient searching
-if not os.path.exists(persistent_directory):
-    print(f"\n--- Creating vector store in {persistent_directory} ---")
-    db = Chroma.from_documents(docs, embeddings, persist_directory=persistent_directory)
-    print(f"--- Finished creating vector store in {persistent_directory} ---")
-else:
+
+def scrape_chunks():
+    """Scrapes the pages and returns their chunks without near-duplicate boilerplate."""
+    from langchain.text_splitter import CharacterTextSplitter
+    from langchain_community.document_loaders import WebBaseLoader
+
+    from dedup import MinHashDeduplicator
+
+    # Step 1: Scrape the content from apple.com using WebBaseLoader
+    # WebBaseLoader loads web pages and extracts their content
+    loader = WebBaseLoader(urls)
+    documents = loader.load()
+
+    # Step 2: Split the scraped content into chunks
+    # CharacterTextSplitter splits the text into smaller chunks
+    text_splitter = CharacterTextSplitter(chunk_size=1000, chunk_overlap=0)
+    docs = text_splitter.split_documents(documents)
+
+    # Drop chunks that repeat navigation, footer and legal boilerplate from other pages
+    # MinHashDeduplicator treats chunks with an estimated Jaccard similarity of 0.8 or more as duplicates
+    deduplicator = MinHashDeduplicator(threshold=0.8, mode="drop")
+    docs, dedup_report = deduplicator.deduplicate(docs)
+
+    # Display information about the split documents
+    print("\n--- Document Chunks Information ---")
+    print(f"Number of document chunks: {len(docs)} ({dedup_report.removed} near-duplicates dropped)")
+    print(f"Sample chunk:\n{docs[0].page_content}\n")
+    return docs, dedup_report
+
+
+@lru_cache(maxsize=None)
+def get_embeddings():
+    # Step 3: Create embeddings for the document chunks
+    # HuggingFaceEmbeddings turns text into numerical vectors that capture semantic meaning
+    # Use the resident embedding service (embedding_service.py) if it is running,
+    # otherwise load the model in this process
+    from embedding_service import get_embeddings as load_embeddings
+
+    return load_embeddings("sentence-transformers/all-mpnet-base-v2")
+
+
+@lru_cache(maxsize=None)
+def get_chunk_store():
+    # Fetched pages have no file to point into, so their chunk text is kept in a
+    # compressed block store next to the vector store instead of in Chroma itself
+    from chunk_store import ChunkStore
+
+    return ChunkStore(current_dir, persistent_directory)
+
+
+@lru_cache(maxsize=None)
+def get_vector_store():
+    """Opens the vector store, scraping the pages and writing it first if needed."""
+    from dotenv import load_dotenv
+    from langchain_community.vectorstores import Chroma
+
+    from bulk_loader import bulk_load, is_store_complete
+
+    # Load environment variables from .env
+    load_dotenv()
+
+    # Step 4: Create and persist the vector store with the embeddings
+    # Chroma stores the embeddings for efficient searching
+    # bulk_load writes them in checkpointed batches and resumes an interrupted run
+    if not is_store_complete(persistent_directory):
+        docs, dedup_report = scrape_chunks()
+        print(f"\n--- Creating vector store in {persistent_directory} ---")
+        start_time = time.perf_counter()
+        docs = get_chunk_store().add(docs)
+        db = bulk_load(docs, get_embeddings(), persistent_directory, batch_size=64)
+        print(f"--- Finished creating vector store in {persistent_directory} ---")
+        print(dedup_report.summary(embedding_seconds=time.perf_counter() - start_time, dimension=768))
+        return db
+
     print(f"Vector store {persistent_directory} already exists. No need to initialize.")
-    db = Chroma(persist_directory=persistent_directory, embedding_function=embeddings)
-
-# Step 5: Query the vector store
-# Create a retriever for querying the vector store
-retriever = db.as_retriever(
-    search_type="similarity",
-    search_kwargs={"k": 3},
-)
-
-# Define the user's question
-query = "What new products are announced on Apple.com?"
-
-# Retrieve relevant documents based on the query
-relevant_docs = retriever.invoke(query)
-
-# Display the relevant results with metadata
-print("\n--- Relevant Documents ---")
-for i, doc in enumerate(relevant_docs, 1):
-    print(f"Document {i}:\n{doc.page_content}\n")
-    if doc.metadata:
-        print(f"Source: {doc.metadata.get('source', 'Unknown')}\n")
+    return Chroma(persist_directory=persistent_directory, embedding_function=get_embeddings())
+
+
+def get_retriever():
+    # Step 5: Query the vector store
+    # Create a retriever for querying the vector store
+    # The chunk store fills in the text of the retrieved chunks
+    return get_vector_store().as_retriever(
+        search_type="similarity",
+        search_kwargs={"k": 3},
+    ) | get_chunk_store().hydrator()
+
+
+def main():
+    # Define the user's question
+    query = "What new products are announced on Apple.com?"
+
+    # Retrieve relevant documents based on the query
+    relevant_docs = get_retriever().invoke(query)
+
+    # Display the relevant results with metadata
+    print("\n--- Relevant Documents ---")
+    for i, doc in enumerate(relevant_docs, 1):
+        print(f"Document {i}:\n{doc.page_content}\n")
+        if doc.metadata:
+            print(f"Source: {doc.metadata.get('source', 'Unknown')}\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+import argparse
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+# Measures memory per worker and cold-start time for 1 to 16 query workers
+# serving a memory-mapped snapshot, optionally next to the same number of
+# workers each opening the Chroma store:
+#
+#   python bench_mmap_index.py db/serving_with_metadata --chroma-store db/chroma_db_with_metadata
+#   python bench_mmap_index.py --synthetic 200000 --dimension 768 --cold
+#   python bench_mmap_index.py db/serving_with_metadata --nprobe 4 8 16 32 --workers
+#
+# RSS counts shared pages in every worker; PSS splits them between the workers
+# mapping them, so the PSS total is what the workers cost together.
+#
+# With --nprobe, recall@k and latency of probing that many IVF lists are first
+# measured against a brute-force search of the snapshot, and the workers then
+# serve with the first nprobe given. Without it they scan every list.
+
+MEMORY_FIELDS = ("VmRSS", "RssAnon", "RssFile", "Pss")
+
+
+def memory_usage():
+    """Returns this process's memory figures from /proc in MiB."""
+    usage = {}
+    for path in ("/proc/self/status", "/proc/self/smaps_rollup"):
+        with open(path) as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if key in MEMORY_FIELDS:
+                    usage[key] = int(value.split()[0]) / 1024
+    return usage
+
+
+def evict_page_cache(path):
+    """Drops a file or directory's clean pages from the page cache, for cold-start runs."""
+    paths = [path] if os.path.isfile(path) else [
+        os.path.join(root, name) for root, _, names in os.walk(path) for name in names
+    ]
+    for file_path in paths:
+        fd = os.open(file_path, os.O_RDONLY)
+        try:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        finally:
+            os.close(fd)
+
+
+def sweep_nprobe(serving_dir, nprobe_values, k=3, num_queries=100, seed=0):
+    """Prints latency and recall@k for each nprobe against brute-force ground truth."""
+    from mmap_index import open_current
+
+    index = open_current(serving_dir)
+    count = len(index)
+    if count <= k:
+        raise ValueError(f"Snapshot has {count} vectors, need more than k={k}")
+
+    # Query with stored vectors and leave each query's own row out of the comparison
+    rng = np.random.default_rng(seed)
+    query_rows = rng.choice(count, size=min(num_queries, count), replace=False)
+    vectors = np.asarray(index.vectors)
+    queries = vectors[query_rows]
+    # Snapshot vectors are already unit length for cosine, so every space ranks by these
+    if index.space == "l2":
+        distances = index.norms[None, :] - 2 * queries @ vectors.T
+    else:
+        distances = -(queries @ vectors.T)
+    truth = np.argsort(distances, axis=1)[:, :k + 1]
+    truth = [set(row[row != query_row][:k]) for row, query_row in zip(truth, query_rows)]
+    del vectors, distances
+
+    nlist = index.manifest["nlist"]
+    print(f"\n{'nprobe':>6} {'recall@' + str(k):>10} {'mean ms':>9} {'p95 ms':>8}   ({nlist} IVF lists)")
+    for nprobe in list(nprobe_values) + [None]:
+        latencies = []
+        hits = 0
+        for query, query_row, expected in zip(queries, query_rows, truth):
+            start = time.perf_counter()
+            results = index.search(query, k=k + 1, nprobe=nprobe)
+            latencies.append(time.perf_counter() - start)
+            found = [row for row, _ in results if row != query_row][:k]
+            hits += len(expected.intersection(found))
+        latencies = np.array(latencies) * 1000
+        print(
+            f"{nprobe or 'all':>6} {hits / (k * len(queries)):>10.3f} {latencies.mean():>9.3f} "
+            f"{np.percentile(latencies, 95):>8.3f}"
+        )
+
+
+def worker(mode, path, collection, dimension, k, nprobe, queries, spawned_at, loaded, release, results):
+    if mode == "mmap":
+        from mmap_index import open_current
+
+        index = open_current(path, nprobe=nprobe)
+
+        def search(vector):
+            return index.search(vector, k=k)
+    else:
+        import chromadb
+
+        chroma_collection = chromadb.PersistentClient(path=path).get_collection(collection)
+
+        def search(vector):
+            return chroma_collection.query(query_embeddings=[vector.tolist()], n_results=k)
+
+    rng = np.random.default_rng(os.getpid())
+    search(rng.standard_normal(dimension).astype(np.float32))
+    # From starting the process to answering its first query
+    cold_start = time.time() - spawned_at
+
+    for _ in range(queries):
+        search(rng.standard_normal(dimension).astype(np.float32))
+
+    # Measure once every worker is up, so shared pages are split between all of them
+    loaded.wait()
+    results.put({"cold_start": cold_start, **memory_usage()})
+    release.wait()
+
+
+def run(mode, path, collection, dimension, workers, k, nprobe, queries, cold):
+    if cold:
+        evict_page_cache(path)
+
+    context = multiprocessing.get_context("spawn")
+    loaded, release = context.Barrier(workers + 1), context.Barrier(workers + 1)
+    results = context.Queue()
+    processes = []
+    for _ in range(workers):
+        process = context.Process(
+            target=worker,
+            args=(mode, path, collection, dimension, k, nprobe, queries, time.time(), loaded, release, results),
+        )
+        process.start()
+        processes.append(process)
+    try:
+        loaded.wait(timeout=600)
+        stats = [results.get(timeout=60) for _ in processes]
+        release.wait(timeout=60)
+    except Exception:
+        for process in processes:
+            process.terminate()
+        raise
+    for process in processes:
+        process.join()
+
+    def mean(key):
+        return sum(s[key] for s in stats) / len(stats)
+
+    print(
+        f"{mode:>6} {workers:>7} {mean('cold_start') * 1000:>9.0f} "
+        f"{max(s['cold_start'] for s in stats) * 1000:>8.0f} {mean('VmRSS'):>8.1f} {mean('RssFile'):>8.1f} "
+        f"{mean('RssAnon'):>8.1f} {mean('Pss'):>8.1f} {sum(s['Pss'] for s in stats):>10.1f}"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark memory and cold start of query workers")
+    parser.add_argument("serving_dir", nargs="?", help="Directory holding the mmap snapshots")
+    parser.add_argument("--chroma-store", help="Also run workers that open this Chroma store")
+    parser.add_argument("--collection", default="langchain")
+    parser.add_argument("--synthetic", type=int, help="Serve a snapshot of this many random vectors instead")
+    parser.add_argument("--dimension", type=int, default=768, help="Dimension of synthetic vectors")
+    parser.add_argument("--workers", type=int, nargs="*", default=[1, 2, 4, 8, 16])
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--nprobe", type=int, nargs="+", help="Measure recall@k probing this many IVF lists")
+    parser.add_argument("--recall-queries", type=int, default=100, help="Queries for the recall measurement")
+    parser.add_argument("--queries", type=int, default=50, help="Queries per worker before measuring")
+    parser.add_argument("--cold", action="store_true", help="Evict the index files from the page cache first")
+    args = parser.parse_args()
+
+    from mmap_index import open_current, write_snapshot
+
+    tmp_dir = None
+    serving_dir = args.serving_dir
+    if args.synthetic:
+        tmp_dir = serving_dir = tempfile.mkdtemp(prefix="mmap_bench_")
+        vectors = np.random.default_rng(0).standard_normal((args.synthetic, args.dimension)).astype(np.float32)
+        ids = [f"id{i}" for i in range(args.synthetic)]
+        write_snapshot(serving_dir, ids, vectors, [f"document {i}" for i in ids], [{"source": "synthetic"}] * len(ids))
+        del vectors
+    elif not serving_dir:
+        parser.error("give a serving directory or --synthetic")
+    dimension = open_current(serving_dir).manifest["dimension"]
+    nprobe = args.nprobe[0] if args.nprobe else None
+
+    try:
+        if args.nprobe:
+            sweep_nprobe(serving_dir, args.nprobe, k=args.k, num_queries=args.recall_queries)
+
+        if args.workers:
+            print(f"\n{'mode':>6} {'workers':>7} {'cold ms':>9} {'max ms':>8} {'RSS MiB':>8} {'file':>8} "
+                  f"{'anon':>8} {'PSS':>8} {'PSS total':>10}")
+        for workers in args.workers:
+            run("mmap", serving_dir, None, dimension, workers, args.k, nprobe, args.queries, args.cold)
+            if args.chroma_store:
+                run(
+                    "chroma", args.chroma_store, args.collection, dimension, workers, args.k, None,
+                    args.queries, args.cold,
+                )
+    finally:
+        if tmp_dir:
+            shutil.rmtree(tmp_dir)
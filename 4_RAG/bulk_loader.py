@@ -0,0 +1,205 @@
+import hashlib
+import json
+import os
+import shutil
+from array import array
+
+from langchain_chroma import Chroma
+
+# Each collection written by bulk_load() gets a checkpoint recording the last
+# committed batch and, once every batch is in, a completion marker. A directory
+# without the marker is never treated as a finished vector store.
+
+
+def _checkpoint_path(persist_directory, collection_name):
+    return os.path.join(persist_directory, f"ingest_{collection_name}.checkpoint.json")
+
+
+def _marker_path(persist_directory, collection_name):
+    return os.path.join(persist_directory, f"ingest_{collection_name}.complete")
+
+
+def _staging_dir(persist_directory, collection_name):
+    return os.path.join(persist_directory, f"ingest_{collection_name}.staging")
+
+
+def _fsync_dir(directory):
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _atomic_write(path, data):
+    """Writes a file so that after a crash it holds either the old or the new content."""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    _fsync_dir(os.path.dirname(path))
+
+
+def _read_checkpoint(persist_directory, collection_name):
+    try:
+        with open(_checkpoint_path(persist_directory, collection_name), encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def _write_checkpoint(persist_directory, collection_name, checkpoint):
+    _atomic_write(
+        _checkpoint_path(persist_directory, collection_name),
+        json.dumps(checkpoint, indent=2).encode("utf-8"),
+    )
+
+
+def is_store_complete(persist_directory, collection_name="langchain"):
+    """Returns True if bulk_load() finished writing the collection."""
+    return os.path.exists(_marker_path(persist_directory, collection_name))
+
+
+def chunk_ids(docs):
+    """Returns stable ids so a replayed batch overwrites its own vectors instead of duplicating them."""
+    ids = []
+    for i, doc in enumerate(docs):
+        key = f"{i}\0{doc.metadata.get('source', '')}\0{doc.page_content}"
+        ids.append(hashlib.sha1(key.encode("utf-8")).hexdigest())
+    return ids
+
+
+def _stored_text(doc):
+    # Chunks referenced by a ChunkStore (chunk_store.py) are embedded from their
+    # text, but only their reference is kept in the vector store
+    return "" if "chunk_ref" in doc.metadata else doc.page_content
+
+
+def _upsert(collection, ids, vectors, docs):
+    # Chroma rejects empty metadata, so chunks without any are written separately
+    with_metadata = [i for i, doc in enumerate(docs) if doc.metadata]
+    without_metadata = [i for i, doc in enumerate(docs) if not doc.metadata]
+    if with_metadata:
+        collection.upsert(
+            ids=[ids[i] for i in with_metadata],
+            embeddings=[vectors[i] for i in with_metadata],
+            metadatas=[docs[i].metadata for i in with_metadata],
+            documents=[_stored_text(docs[i]) for i in with_metadata],
+        )
+    if without_metadata:
+        collection.upsert(
+            ids=[ids[i] for i in without_metadata],
+            embeddings=[vectors[i] for i in without_metadata],
+            documents=[_stored_text(docs[i]) for i in without_metadata],
+        )
+
+
+def _stage_vectors(staging_dir, batch, vectors):
+    values = array("f")
+    for vector in vectors:
+        values.extend(vector)
+    _atomic_write(os.path.join(staging_dir, f"batch_{batch:06d}.f32"), values.tobytes())
+
+
+def _load_staged_vectors(staging_dir, batch, dim):
+    values = array("f")
+    with open(os.path.join(staging_dir, f"batch_{batch:06d}.f32"), "rb") as f:
+        values.frombytes(f.read())
+    return [values[i:i + dim].tolist() for i in range(0, len(values), dim)]
+
+
+def bulk_load(docs, embeddings, persist_directory, collection_name="langchain", batch_size=64, defer_index=False):
+    """Writes documents into a Chroma collection in checkpointed batches, resuming an interrupted run.
+
+    With defer_index=True every batch is embedded and staged on disk first, and
+    the vectors are only added to Chroma's HNSW index once all of them exist.
+    """
+    os.makedirs(persist_directory, exist_ok=True)
+    ids = chunk_ids(docs)
+    fingerprint = hashlib.sha256("\n".join(ids).encode("utf-8")).hexdigest()
+    staging_dir = _staging_dir(persist_directory, collection_name)
+    db = Chroma(
+        collection_name=collection_name,
+        persist_directory=persist_directory,
+        embedding_function=embeddings,
+    )
+
+    checkpoint = _read_checkpoint(persist_directory, collection_name)
+    if (
+        checkpoint
+        and checkpoint["fingerprint"] == fingerprint
+        and is_store_complete(persist_directory, collection_name)
+    ):
+        print(f"Collection '{collection_name}' is already complete. No need to load it again.")
+        return db
+
+    if (
+        checkpoint is None
+        or checkpoint["fingerprint"] != fingerprint
+        or checkpoint["batch_size"] != batch_size
+        or checkpoint["defer_index"] != defer_index
+    ):
+        # Anything already in the collection came from a different or unknown run, so start over
+        if checkpoint is not None:
+            print(f"Checkpoint for '{collection_name}' doesn't match these documents, starting over")
+        if os.path.exists(_marker_path(persist_directory, collection_name)):
+            os.remove(_marker_path(persist_directory, collection_name))
+        db.delete_collection()
+        db = Chroma(
+            collection_name=collection_name,
+            persist_directory=persist_directory,
+            embedding_function=embeddings,
+        )
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        checkpoint = {
+            "fingerprint": fingerprint,
+            "total": len(docs),
+            "batch_size": batch_size,
+            "defer_index": defer_index,
+            "dim": None,
+            "embedded_batches": 0,
+            "indexed_batches": 0,
+        }
+        _write_checkpoint(persist_directory, collection_name, checkpoint)
+    else:
+        print(
+            f"Resuming '{collection_name}': {checkpoint['embedded_batches']} batches embedded, "
+            f"{checkpoint['indexed_batches']} batches indexed"
+        )
+
+    num_batches = (len(docs) + batch_size - 1) // batch_size
+    if defer_index:
+        os.makedirs(staging_dir, exist_ok=True)
+
+    # Phase 1: embed each batch and either index it right away or stage it on disk
+    for batch in range(checkpoint["embedded_batches"], num_batches):
+        start = batch * batch_size
+        batch_docs = docs[start:start + batch_size]
+        vectors = embeddings.embed_documents([doc.page_content for doc in batch_docs])
+        checkpoint["dim"] = len(vectors[0])
+
+        if defer_index:
+            _stage_vectors(staging_dir, batch, vectors)
+        else:
+            # Chroma has durably written the batch once upsert returns
+            _upsert(db._collection, ids[start:start + batch_size], vectors, batch_docs)
+            checkpoint["indexed_batches"] = batch + 1
+        checkpoint["embedded_batches"] = batch + 1
+        _write_checkpoint(persist_directory, collection_name, checkpoint)
+        print(f"Embedded batch {batch + 1}/{num_batches} of '{collection_name}'")
+
+    # Phase 2: build the index from the staged vectors once all of them are written
+    for batch in range(checkpoint["indexed_batches"], num_batches):
+        start = batch * batch_size
+        vectors = _load_staged_vectors(staging_dir, batch, checkpoint["dim"])
+        _upsert(db._collection, ids[start:start + batch_size], vectors, docs[start:start + batch_size])
+        checkpoint["indexed_batches"] = batch + 1
+        _write_checkpoint(persist_directory, collection_name, checkpoint)
+        print(f"Indexed batch {batch + 1}/{num_batches} of '{collection_name}'")
+
+    shutil.rmtree(staging_dir, ignore_errors=True)
+    _atomic_write(_marker_path(persist_directory, collection_name), fingerprint.encode("utf-8"))
+    print(f"Finished loading {len(docs)} chunks into '{collection_name}'")
+    return db
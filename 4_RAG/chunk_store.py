@@ -0,0 +1,194 @@
+import hashlib
+import mmap
+import os
+import zlib
+from collections import OrderedDict
+
+from langchain_core.documents import Document
+from langchain_core.runnables import RunnableLambda
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Chunks referenced by a ChunkStore keep these metadata keys in the vector
+# store instead of their text; hydrate() turns them back into text.
+REF_KEYS = (
+    "chunk_ref", "chunk_path", "chunk_offset", "chunk_length",
+    "chunk_block_offset", "chunk_block_length", "chunk_codec", "chunk_hash",
+)
+BLOCK_FILE = "chunks.blk"
+
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()[:16]
+
+
+class BlockStore:
+    """File of compressed blocks holding chunk text that has no source file, like fetched web pages."""
+
+    def __init__(self, path, block_size=64 * 1024, cache_blocks=64):
+        self.path = path
+        self.block_size = block_size
+        self.codec = "zstd" if zstandard else "zlib"
+        self.cache_blocks = cache_blocks
+        self._cache = OrderedDict()
+
+    def _compress(self, data):
+        if self.codec == "zstd":
+            return zstandard.ZstdCompressor(level=10).compress(data)
+        return zlib.compress(data, 9)
+
+    @staticmethod
+    def _decompress(codec, data):
+        if codec == "zstd":
+            if zstandard is None:
+                raise ImportError("Chunks were compressed with zstd, install the 'zstandard' package to read them")
+            return zstandard.ZstdDecompressor().decompress(data)
+        return zlib.decompress(data)
+
+    def write(self, chunks):
+        """Rewrites the file with the given chunk bytes and returns a reference for each chunk.
+
+        The layout only depends on the chunks, so rewriting the same chunks
+        after an interrupted ingestion yields the same references.
+        """
+        refs = []
+        block, block_refs = bytearray(), []
+        with open(self.path + ".tmp", "wb") as f:
+
+            def flush():
+                compressed = self._compress(bytes(block))
+                block_offset = f.tell()
+                f.write(compressed)
+                for offset, length in block_refs:
+                    refs.append((block_offset, len(compressed), offset, length))
+                block.clear()
+                block_refs.clear()
+
+            for data in chunks:
+                if block and len(block) + len(data) > self.block_size:
+                    flush()
+                block_refs.append((len(block), len(data)))
+                block.extend(data)
+            if block_refs:
+                flush()
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(self.path + ".tmp", self.path)
+        self._cache.clear()
+        return refs
+
+    def read(self, block_offset, block_length, codec):
+        """Returns a decompressed block, keeping recently used blocks in memory."""
+        key = (block_offset, block_length)
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            return self._cache[key]
+        with open(self.path, "rb") as f:
+            f.seek(block_offset)
+            block = self._decompress(codec, f.read(block_length))
+        self._cache[key] = block
+        while len(self._cache) > self.cache_blocks:
+            self._cache.popitem(last=False)
+        return block
+
+
+class ChunkStore:
+    """Keeps chunk text out of the vector store, serving it from source files or a compressed block store.
+
+    Chunks found verbatim in their source file are referenced by byte range and
+    read back zero-copy from a memory map. Everything else goes to the block
+    store next to the vector store.
+    """
+
+    def __init__(self, root_dir, persist_directory):
+        self.root_dir = root_dir
+        self.persist_directory = persist_directory
+        self.block_store = BlockStore(os.path.join(persist_directory, BLOCK_FILE))
+        self._maps = {}
+
+    def _map(self, path):
+        if path not in self._maps:
+            with open(os.path.join(self.root_dir, path), "rb") as f:
+                self._maps[path] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._maps[path]
+
+    def add(self, docs, path_of=None):
+        """Returns the documents with chunk references added to their metadata.
+
+        path_of maps a document to its source file relative to root_dir, or
+        None when it has none. The text stays in page_content for embedding;
+        bulk_load() doesn't write it to the vector store for referenced chunks.
+        """
+        refs = [None] * len(docs)
+        cursors = {}
+        blocked = []
+
+        for i, doc in enumerate(docs):
+            data = doc.page_content.encode("utf-8")
+            path = path_of(doc) if path_of else None
+            if path and os.path.exists(os.path.join(self.root_dir, path)):
+                source = self._map(path)
+                # Chunks come in file order, so search onwards from the previous chunk first
+                offset = source.find(data, cursors.get(path, 0))
+                if offset == -1:
+                    offset = source.find(data)
+                if offset != -1:
+                    cursors[path] = offset + len(data)
+                    refs[i] = {
+                        "chunk_ref": "file", "chunk_path": path, "chunk_offset": offset,
+                        "chunk_length": len(data), "chunk_hash": content_hash(data),
+                    }
+                    continue
+            # Text that isn't in a file verbatim (fetched pages, normalised text) goes to the block store
+            blocked.append((i, data))
+
+        os.makedirs(self.persist_directory, exist_ok=True)
+        block_refs = self.block_store.write([data for _, data in blocked])
+        for (i, data), (block_offset, block_length, offset, length) in zip(blocked, block_refs):
+            refs[i] = {
+                "chunk_ref": "block", "chunk_block_offset": block_offset,
+                "chunk_block_length": block_length, "chunk_offset": offset, "chunk_length": length,
+                "chunk_codec": self.block_store.codec, "chunk_hash": content_hash(data),
+            }
+
+        referenced = sum(1 for ref in refs if ref["chunk_ref"] == "file")
+        print(f"Chunk store: {referenced} chunks referenced in source files, {len(blocked)} in {BLOCK_FILE}")
+        return [
+            Document(page_content=doc.page_content, metadata={**doc.metadata, **ref})
+            for doc, ref in zip(docs, refs)
+        ]
+
+    def text(self, metadata):
+        """Returns the text of a referenced chunk, checking it against the stored hash."""
+        offset, length = metadata["chunk_offset"], metadata["chunk_length"]
+        if metadata["chunk_ref"] == "file":
+            data = memoryview(self._map(metadata["chunk_path"]))[offset:offset + length]
+        else:
+            block = self.block_store.read(
+                metadata["chunk_block_offset"], metadata["chunk_block_length"], metadata["chunk_codec"]
+            )
+            data = memoryview(block)[offset:offset + length]
+        if content_hash(data) != metadata["chunk_hash"]:
+            raise ValueError(
+                f"Chunk text for {metadata.get('source', 'unknown source')} changed since it was indexed. "
+                "Rebuild the vector store."
+            )
+        return str(data, "utf-8")
+
+    def hydrate(self, docs):
+        """Fills in the text of referenced chunks; other documents pass through unchanged."""
+        hydrated = []
+        for doc in docs:
+            if "chunk_ref" not in doc.metadata:
+                hydrated.append(doc)
+                continue
+            metadata = {key: value for key, value in doc.metadata.items() if key not in REF_KEYS}
+            hydrated.append(Document(page_content=self.text(doc.metadata), metadata=metadata))
+        return hydrated
+
+    def hydrator(self):
+        """Returns a runnable to pipe after a retriever, e.g. `retriever | chunk_store.hydrator()`."""
+        return RunnableLambda(self.hydrate)
@@ -0,0 +1,114 @@
+import logging
+import math
+import re
+from collections import OrderedDict
+
+from langchain_core.documents import Document
+
+logger = logging.getLogger(__name__)
+
+# Sentence boundaries: end punctuation followed by whitespace, or a blank line
+SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?])\s+|\n\s*\n")
+
+
+def split_sentences(text, min_chars=20):
+    """Splits a chunk into sentences, dropping fragments too short to carry meaning."""
+    sentences = (" ".join(part.split()) for part in SENTENCE_BOUNDARY.split(text))
+    return [sentence for sentence in sentences if len(sentence) >= min_chars]
+
+
+def huggingface_token_counter(model_name):
+    """Returns a function counting tokens with the tokenizer of the given HuggingFace model."""
+    from transformers import AutoTokenizer
+
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+
+    def count_tokens(text):
+        return len(tokenizer.encode(text, add_special_tokens=False))
+
+    return count_tokens
+
+
+def _cosine(a, b):
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+class ContextPacker:
+    """Packs the sentences of retrieved chunks most relevant to a question into a token budget."""
+
+    def __init__(self, embeddings, token_counter, max_tokens=400, separator_tokens=2, cache_size=10000):
+        self.embeddings = embeddings
+        self.count_tokens = token_counter
+        self.max_tokens = max_tokens
+        # Tokens spent on the separator the stuff-documents chain puts between documents
+        self.separator_tokens = separator_tokens
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+
+    def embed_sentences(self, sentences):
+        """Returns sentence embeddings, embedding only the sentences not already cached."""
+        missing = list(dict.fromkeys(s for s in sentences if s not in self._cache))
+        if missing:
+            for sentence, vector in zip(missing, self.embeddings.embed_documents(missing)):
+                self._cache[sentence] = vector
+        vectors = []
+        for sentence in sentences:
+            self._cache.move_to_end(sentence)
+            vectors.append(self._cache[sentence])
+        # Evict the least recently used sentences once the cache is full
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return vectors
+
+    def pack(self, question, docs, max_tokens=None):
+        """Returns documents holding the best-scoring sentences that fit in the token budget."""
+        budget = self.max_tokens if max_tokens is None else max_tokens
+        if budget <= 0:
+            # Answering without any context would only look like a grounded answer
+            raise ValueError(f"No token budget left for context (budget={budget})")
+        candidates = [
+            (doc_index, sentence_index, sentence)
+            for doc_index, doc in enumerate(docs)
+            for sentence_index, sentence in enumerate(split_sentences(doc.page_content))
+        ]
+        if not candidates:
+            return []
+
+        question_vector = self.embeddings.embed_query(question)
+        sentence_vectors = self.embed_sentences([sentence for _, _, sentence in candidates])
+        scored = sorted(
+            zip((_cosine(question_vector, v) for v in sentence_vectors), candidates),
+            key=lambda item: item[0],
+            reverse=True,
+        )
+
+        # Greedily take the best sentences, skipping any that would overflow the budget
+        used = 0
+        picked = {}
+        for score, (doc_index, sentence_index, sentence) in scored:
+            cost = self.count_tokens(sentence) + 1
+            if doc_index not in picked:
+                cost += self.separator_tokens
+            if used + cost > budget:
+                continue
+            used += cost
+            picked.setdefault(doc_index, []).append((sentence_index, sentence, score))
+
+        logger.info(
+            "Packed %d of %d sentences into %d of %d tokens",
+            sum(len(sentences) for sentences in picked.values()), len(candidates), used, budget,
+        )
+
+        # Keep the sentences of each chunk in their original order, best chunks first
+        packed = []
+        for doc_index, sentences in sorted(
+            picked.items(), key=lambda item: max(score for _, _, score in item[1]), reverse=True
+        ):
+            sentences.sort()
+            packed.append(Document(
+                page_content=" ".join(sentence for _, sentence, _ in sentences),
+                metadata=dict(docs[doc_index].metadata),
+            ))
+        return packed
@@ -0,0 +1,348 @@
+import argparse
+import json
+import os
+import pickle
+import sqlite3
+import struct
+import time
+
+# Maintenance tool for the persisted Chroma stores in 4_RAG/db
+#
+#   python db_maintenance.py inspect db/chroma_db_apple_hf
+#   python db_maintenance.py compact db/chroma_db_apple_hf
+#   python db_maintenance.py retune db/chroma_db_apple_hf --M 32 --ef-construction 200
+#   python db_maintenance.py sweep db/chroma_db_apple_hf --ef 10 20 40 80 160 --k 10
+#
+# compact and retune rewrite the store, so no other process may have it open.
+
+# header.bin written by Chroma's persistent HNSW segment: a persistence version
+# followed by the hnswlib index header
+HNSW_HEADER = struct.Struct("<iQQQQQQiIQQQdQ")
+HNSW_HEADER_FIELDS = (
+    "persistence_version", "offset_level0", "max_elements", "element_count",
+    "size_data_per_element", "label_offset", "offset_data", "max_level",
+    "entry_point", "max_m", "max_m0", "M", "level_multiplier", "ef_construction",
+)
+COPY_BATCH_SIZE = 1000
+COMPACT_SUFFIX = "__compact"
+
+
+def read_hnsw_header(segment_dir):
+    """Parses header.bin of a persisted HNSW segment."""
+    with open(os.path.join(segment_dir, "header.bin"), "rb") as f:
+        header = dict(zip(HNSW_HEADER_FIELDS, HNSW_HEADER.unpack(f.read(HNSW_HEADER.size))))
+    # Each element stores its level-0 links, then the vector, then its label
+    header["dimension"] = (header["label_offset"] - header["offset_data"]) // 4
+    return header
+
+
+def read_live_label_count(segment_dir):
+    """Returns the number of live elements recorded in the segment's id/label map, if readable."""
+    path = os.path.join(segment_dir, "index_metadata.pickle")
+    if not os.path.exists(path):
+        return None
+    try:
+        # Unpickling needs chromadb's PersistentData class to be importable
+        with open(path, "rb") as f:
+            return len(pickle.load(f).id_to_label)
+    except Exception:
+        return None
+
+
+def hnsw_params(conn, collection_id):
+    """Returns the HNSW parameters of a collection from its configuration and metadata."""
+    params = {"space": "l2", "M": 16, "ef_construction": 100, "ef_search": 10, "sync_threshold": 1000}
+
+    # Older Chroma versions keep the parameters as "hnsw:*" collection metadata
+    legacy_keys = {
+        "hnsw:space": "space", "hnsw:M": "M", "hnsw:construction_ef": "ef_construction",
+        "hnsw:search_ef": "ef_search", "hnsw:sync_threshold": "sync_threshold",
+    }
+    for key, str_value, int_value in conn.execute(
+        "SELECT key, str_value, int_value FROM collection_metadata WHERE collection_id = ?",
+        (collection_id,),
+    ):
+        if key in legacy_keys:
+            params[legacy_keys[key]] = str_value if str_value is not None else int_value
+
+    # Newer versions keep them in the collection configuration
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(collections)")]
+    if "config_json_str" in columns:
+        (config_json,) = conn.execute(
+            "SELECT config_json_str FROM collections WHERE id = ?", (collection_id,)
+        ).fetchone()
+        hnsw = (json.loads(config_json or "{}").get("vector_index") or {}).get("hnsw") or {}
+        params.update({
+            key: hnsw[config_key]
+            for key, config_key in (
+                ("space", "space"), ("M", "max_neighbors"), ("ef_construction", "ef_construction"),
+                ("ef_search", "ef_search"), ("sync_threshold", "sync_threshold"),
+            )
+            if config_key in hnsw
+        })
+    return params
+
+
+def _dir_size(path):
+    return sum(
+        os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names
+    )
+
+
+def inspect_store(store):
+    """Prints element counts, deleted-entry bloat, HNSW parameters and file sizes of a store."""
+    db_path = os.path.join(store, "chroma.sqlite3")
+    if not os.path.exists(db_path):
+        raise FileNotFoundError(f"{db_path} does not exist. Is {store} a Chroma store?")
+
+    # Open read-only so inspecting never modifies the store
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    free_pages = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    print(f"Store: {store}")
+    print(f"  chroma.sqlite3: {os.path.getsize(db_path):,} bytes ({free_pages * page_size:,} bytes free pages)")
+
+    collections = conn.execute("SELECT id, name, dimension FROM collections ORDER BY name").fetchall()
+    for collection_id, name, dimension in collections:
+        segments = dict(conn.execute(
+            "SELECT scope, id FROM segments WHERE collection = ?", (collection_id,)
+        ).fetchall())
+        live = conn.execute(
+            "SELECT COUNT(*) FROM embeddings WHERE segment_id = ?", (segments.get("METADATA"),)
+        ).fetchone()[0]
+        wal_entries = conn.execute(
+            "SELECT COUNT(*) FROM embeddings_queue WHERE topic LIKE ?", (f"%{collection_id}",)
+        ).fetchone()[0]
+        params = hnsw_params(conn, collection_id)
+
+        print(f"\n  Collection '{name}' ({collection_id})")
+        print(f"    dimension: {dimension}")
+        print(f"    live embeddings: {live:,}")
+        print(f"    write-ahead log entries: {wal_entries:,}")
+        print(
+            f"    HNSW config: space={params['space']} M={params['M']} "
+            f"ef_construction={params['ef_construction']} ef_search={params['ef_search']} "
+            f"sync_threshold={params['sync_threshold']}"
+        )
+
+        segment_dir = os.path.join(store, segments.get("VECTOR", ""))
+        if not segments.get("VECTOR") or not os.path.exists(os.path.join(segment_dir, "header.bin")):
+            print("    HNSW segment: not persisted yet")
+            continue
+
+        header = read_hnsw_header(segment_dir)
+        indexed_live = read_live_label_count(segment_dir)
+        print(f"    HNSW segment: {segment_dir} ({_dir_size(segment_dir):,} bytes)")
+        print(
+            f"      elements: {header['element_count']:,} of {header['max_elements']:,} allocated, "
+            f"M={header['M']} max_M0={header['max_m0']} ef_construction={header['ef_construction']} "
+            f"max_level={header['max_level']}"
+        )
+        if indexed_live is not None:
+            deleted = header["element_count"] - indexed_live
+            share = deleted / header["element_count"] if header["element_count"] else 0.0
+            print(f"      deleted elements still in the graph: {deleted:,} ({share:.1%})")
+        if header["element_count"] < live:
+            print(f"      {live - header['element_count']:,} embeddings not yet flushed to the graph")
+    conn.close()
+
+
+def _open_collection(store, name):
+    import chromadb
+
+    client = chromadb.PersistentClient(path=store)
+    return client, client.get_collection(name)
+
+
+def _collection_id(store, name):
+    conn = sqlite3.connect(os.path.join(store, "chroma.sqlite3"))
+    (collection_id,) = conn.execute("SELECT id FROM collections WHERE name = ?", (name,)).fetchone()
+    params = hnsw_params(conn, collection_id)
+    conn.close()
+    return collection_id, params
+
+
+def _copy_rows(source, target):
+    """Copies every live embedding with its document and metadata into another collection."""
+    copied = 0
+    offset = 0
+    while True:
+        rows = source.get(
+            include=["embeddings", "documents", "metadatas"], limit=COPY_BATCH_SIZE, offset=offset
+        )
+        if not rows["ids"]:
+            return copied
+        # Chroma rejects empty metadata, so rows without any are added separately
+        groups = {}
+        for i, metadata in enumerate(rows["metadatas"]):
+            groups.setdefault(bool(metadata), []).append(i)
+        for has_metadata, indexes in groups.items():
+            target.add(
+                ids=[rows["ids"][i] for i in indexes],
+                embeddings=[list(rows["embeddings"][i]) for i in indexes],
+                documents=[rows["documents"][i] or "" for i in indexes],
+                metadatas=[rows["metadatas"][i] for i in indexes] if has_metadata else None,
+            )
+        copied += len(rows["ids"])
+        offset += len(rows["ids"])
+        print(f"    copied {copied:,} embeddings")
+
+
+def rebuild_collection(store, name, M=None, ef_construction=None, ef_search=None):
+    """Rewrites a collection into a fresh HNSW graph, dropping deleted vectors and applying new parameters."""
+    import chromadb
+
+    client = chromadb.PersistentClient(path=store)
+    # Chroma 0.6 lists names (a str subclass that raises on .name), older versions list collections
+    existing = {c if isinstance(c, str) else c.name for c in client.list_collections()}
+    temp_name = name + COMPACT_SUFFIX
+
+    # Finish a rebuild that was interrupted after the original collection was dropped
+    if name not in existing and temp_name in existing:
+        print(f"Finishing interrupted rebuild of '{name}'")
+        client.get_collection(temp_name).modify(name=name)
+        return
+    if temp_name in existing:
+        client.delete_collection(temp_name)
+
+    _, params = _collection_id(store, name)
+    params.update({
+        key: value
+        for key, value in (("M", M), ("ef_construction", ef_construction), ("ef_search", ef_search))
+        if value is not None
+    })
+    print(
+        f"Rebuilding '{name}' with M={params['M']} ef_construction={params['ef_construction']} "
+        f"ef_search={params['ef_search']}"
+    )
+
+    source = client.get_collection(name)
+    # Keep the collection's other metadata, with the new HNSW parameters layered on top
+    target = client.create_collection(
+        temp_name,
+        metadata={
+            **(source.metadata or {}),
+            "hnsw:space": params["space"],
+            "hnsw:M": params["M"],
+            "hnsw:construction_ef": params["ef_construction"],
+            "hnsw:search_ef": params["ef_search"],
+        },
+    )
+    copied = _copy_rows(source, target)
+
+    # Swap the rebuilt collection in under the original name
+    client.delete_collection(name)
+    target.modify(name=name)
+    print(f"Rebuilt '{name}' with {copied:,} embeddings")
+
+    # Release Chroma's handles before reclaiming the space freed in the database file
+    client.clear_system_cache()
+    conn = sqlite3.connect(os.path.join(store, "chroma.sqlite3"))
+    conn.execute("VACUUM")
+    conn.close()
+
+
+def _load_vectors(store, name):
+    import numpy as np
+
+    _, collection = _open_collection(store, name)
+    rows = collection.get(include=["embeddings"])
+    return rows["ids"], np.asarray(rows["embeddings"], dtype=np.float32)
+
+
+def _brute_force_neighbors(vectors, queries, k, space):
+    """Returns the exact k nearest stored vectors for each query."""
+    import numpy as np
+
+    if space == "l2":
+        distances = (
+            (queries ** 2).sum(axis=1)[:, None] - 2 * queries @ vectors.T + (vectors ** 2).sum(axis=1)[None, :]
+        )
+    elif space == "ip":
+        distances = 1.0 - queries @ vectors.T
+    else:
+        normed = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+        distances = 1.0 - (queries / np.linalg.norm(queries, axis=1, keepdims=True)) @ normed.T
+    return np.argsort(distances, axis=1)[:, :k]
+
+
+def sweep_ef_search(store, name, ef_values, k=10, num_queries=100, M=None, ef_construction=None, seed=0):
+    """Prints latency and recall@k for each ef_search against brute-force ground truth."""
+    import hnswlib
+    import numpy as np
+
+    _, params = _collection_id(store, name)
+    M = M or params["M"]
+    ef_construction = ef_construction or params["ef_construction"]
+    ids, vectors = _load_vectors(store, name)
+    if len(ids) <= k:
+        raise ValueError(f"Collection '{name}' has {len(ids)} embeddings, need more than k={k}")
+
+    # Build the graph the collection's parameters produce from the stored vectors
+    print(f"Building HNSW graph over {len(ids):,} vectors (M={M}, ef_construction={ef_construction})")
+    index = hnswlib.Index(space=params["space"], dim=vectors.shape[1])
+    index.init_index(max_elements=len(ids), M=M, ef_construction=ef_construction)
+    index.add_items(vectors, np.arange(len(ids)))
+    index.set_num_threads(1)
+
+    # Query with stored vectors and leave each query's own vector out of the comparison
+    rng = np.random.default_rng(seed)
+    query_rows = rng.choice(len(ids), size=min(num_queries, len(ids)), replace=False)
+    queries = vectors[query_rows]
+    truth = _brute_force_neighbors(vectors, queries, k + 1, params["space"])
+    truth = [set(row[row != query_row][:k]) for row, query_row in zip(truth, query_rows)]
+
+    print(f"\n{'ef_search':>9} {'recall@' + str(k):>10} {'mean ms':>9} {'p95 ms':>8} {'QPS':>8}")
+    for ef in ef_values:
+        index.set_ef(max(ef, k + 1))
+        latencies = []
+        hits = 0
+        for query, query_row, expected in zip(queries, query_rows, truth):
+            start = time.perf_counter()
+            labels, _ = index.knn_query(query, k=k + 1)
+            latencies.append(time.perf_counter() - start)
+            found = [label for label in labels[0] if label != query_row][:k]
+            hits += len(expected.intersection(found))
+        latencies = np.array(latencies) * 1000
+        print(
+            f"{ef:>9} {hits / (k * len(queries)):>10.3f} {latencies.mean():>9.3f} "
+            f"{np.percentile(latencies, 95):>8.3f} {1000 / latencies.mean():>8.0f}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect and maintain persisted Chroma stores")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    inspect_parser = commands.add_parser("inspect", help="Report counts, bloat and HNSW parameters")
+    inspect_parser.add_argument("store", help="Persist directory of the store")
+
+    compact_parser = commands.add_parser("compact", help="Rewrite a collection without deleted vectors")
+    retune_parser = commands.add_parser("retune", help="Rebuild a collection's HNSW graph with new parameters")
+    sweep_parser = commands.add_parser("sweep", help="Measure latency and recall across ef_search values")
+    for sub in (compact_parser, retune_parser, sweep_parser):
+        sub.add_argument("store", help="Persist directory of the store")
+        sub.add_argument("--collection", default="langchain", help="Collection name (default: langchain)")
+    for sub in (retune_parser, sweep_parser):
+        sub.add_argument("--M", type=int, help="Maximum neighbours per node")
+        sub.add_argument("--ef-construction", type=int, help="Candidate list size while building")
+    retune_parser.add_argument("--ef-search", type=int, help="Candidate list size while searching")
+    sweep_parser.add_argument("--ef", type=int, nargs="+", default=[10, 20, 40, 80, 160, 320])
+    sweep_parser.add_argument("--k", type=int, default=10, help="Neighbours per query")
+    sweep_parser.add_argument("--queries", type=int, default=100, help="Number of sampled queries")
+    args = parser.parse_args()
+
+    if args.command == "inspect":
+        inspect_store(args.store)
+    elif args.command == "compact":
+        rebuild_collection(args.store, args.collection)
+    elif args.command == "retune":
+        rebuild_collection(
+            args.store, args.collection, M=args.M, ef_construction=args.ef_construction,
+            ef_search=args.ef_search,
+        )
+    else:
+        sweep_ef_search(
+            args.store, args.collection, args.ef, k=args.k, num_queries=args.queries,
+            M=args.M, ef_construction=args.ef_construction,
+        )
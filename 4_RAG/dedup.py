@@ -0,0 +1,125 @@
+import re
+import zlib
+
+import numpy as np
+
+# MinHash works modulo a Mersenne prime below 2^32 so (a * h + b) never overflows uint64
+MERSENNE_PRIME = (1 << 31) - 1
+WORD = re.compile(r"\w+")
+
+
+def shingles(text, size=5):
+    """Returns the set of hashed word n-grams of a text."""
+    words = WORD.findall(text.lower())
+    if len(words) < size:
+        grams = [" ".join(words)]
+    else:
+        grams = (" ".join(words[i:i + size]) for i in range(len(words) - size + 1))
+    return {zlib.crc32(gram.encode("utf-8")) % MERSENNE_PRIME for gram in grams}
+
+
+def choose_bands(num_perm, threshold):
+    """Picks the band count and rows per band whose LSH threshold (1/b)^(1/r) is closest below the target.
+
+    Staying below the target favours recall; candidate pairs are checked
+    against the real threshold afterwards, so false positives are cheap.
+    """
+    candidates = [
+        (bands, num_perm // bands) for bands in range(1, num_perm + 1) if num_perm % bands == 0
+    ]
+    below = [pair for pair in candidates if (1 / pair[0]) ** (1 / pair[1]) <= threshold]
+    return min(below or candidates, key=lambda pair: abs((1 / pair[0]) ** (1 / pair[1]) - threshold))
+
+
+class DedupReport:
+    """What a de-duplication pass removed and what that saves downstream."""
+
+    def __init__(self, total, kept, chars_removed):
+        self.total = total
+        self.kept = kept
+        self.removed = total - kept
+        self.chars_removed = chars_removed
+
+    def summary(self, embedding_seconds=None, dimension=None):
+        """Describes the savings, extrapolating from the time spent embedding the kept chunks."""
+        lines = [
+            f"Near-duplicate chunks removed: {self.removed} of {self.total} "
+            f"({self.removed / self.total:.1%})" if self.total else "No chunks to de-duplicate",
+            f"Text not embedded or stored: {self.chars_removed:,} characters",
+        ]
+        if embedding_seconds is not None and self.kept:
+            saved = embedding_seconds / self.kept * self.removed
+            lines.append(f"Estimated embedding time saved: {saved:.1f}s")
+        if dimension is not None:
+            # float32 vectors plus the chunk text that would have been stored alongside them
+            saved_bytes = self.removed * dimension * 4 + self.chars_removed
+            lines.append(f"Estimated index size saved: {saved_bytes / 1024:,.1f} KiB")
+        return "\n".join(lines)
+
+
+class MinHashDeduplicator:
+    """Drops or merges near-duplicate chunks using MinHash signatures and LSH banding."""
+
+    def __init__(self, threshold=0.8, num_perm=128, shingle_size=5, mode="drop", seed=1):
+        if mode not in ("drop", "merge"):
+            raise ValueError(f"mode must be 'drop' or 'merge', got {mode!r}")
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.mode = mode
+        self.bands, self.rows = choose_bands(num_perm, threshold)
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+
+    def signature(self, text):
+        """Returns the MinHash signature of a text."""
+        hashes = np.fromiter(shingles(text, self.shingle_size), dtype=np.uint64)
+        permuted = (np.outer(self._a, hashes) + self._b[:, None]) % MERSENNE_PRIME
+        return permuted.min(axis=1)
+
+    def deduplicate(self, docs):
+        """Returns the documents without near-duplicates of earlier ones, and a report."""
+        kept = []
+        signatures = []
+        buckets = {}
+        chars_removed = 0
+
+        for doc in docs:
+            signature = self.signature(doc.page_content)
+            band_keys = [
+                (band, signature[band * self.rows:(band + 1) * self.rows].tobytes())
+                for band in range(self.bands)
+            ]
+
+            # Only chunks sharing at least one band are compared, then the estimated Jaccard decides
+            candidates = {index for key in band_keys for index in buckets.get(key, ())}
+            duplicate_of = next(
+                (
+                    index for index in sorted(candidates)
+                    if np.mean(signatures[index] == signature) >= self.threshold
+                ),
+                None,
+            )
+
+            if duplicate_of is None:
+                for key in band_keys:
+                    buckets.setdefault(key, []).append(len(kept))
+                kept.append(doc)
+                signatures.append(signature)
+                continue
+
+            chars_removed += len(doc.page_content)
+            if self.mode == "merge":
+                self._merge(kept[duplicate_of], doc)
+
+        return kept, DedupReport(len(docs), len(kept), chars_removed)
+
+    def _merge(self, kept_doc, duplicate):
+        # Chroma metadata values must be scalars, so the duplicates' sources are joined into one string
+        source = duplicate.metadata.get("source")
+        kept_doc.metadata["duplicate_count"] = kept_doc.metadata.get("duplicate_count", 0) + 1
+        if source and source != kept_doc.metadata.get("source"):
+            sources = kept_doc.metadata.get("duplicate_sources", "")
+            if source not in sources.split(", "):
+                kept_doc.metadata["duplicate_sources"] = f"{sources}, {source}" if sources else source
@@ -0,0 +1,242 @@
+import argparse
+import json
+import os
+import socket
+import socketserver
+import stat
+import struct
+import tempfile
+import threading
+from array import array
+
+from langchain_core.embeddings import Embeddings
+
+# Start the daemon once per host:
+#   python embedding_service.py --model sentence-transformers/all-mpnet-base-v2
+# Scripts then call get_embeddings(model_name), which connects to the daemon
+# and falls back to loading the model in-process when it isn't running.
+
+DEFAULT_MODEL = "sentence-transformers/all-mpnet-base-v2"
+# The socket lives in a directory only its user can enter, so other local users
+# can neither connect to the daemon nor put a socket of their own in its place
+DEFAULT_SOCKET = os.getenv("EMBEDDING_SERVICE_SOCKET") or (
+    os.path.join(os.environ["XDG_RUNTIME_DIR"], "langchain-embeddings.sock")
+    if os.getenv("XDG_RUNTIME_DIR")
+    else os.path.join(tempfile.gettempdir(), f"langchain-embeddings-{os.getuid()}", "embeddings.sock")
+)
+
+# Every message is a 4-byte big-endian length followed by the payload
+LENGTH = struct.Struct(">I")
+
+
+def _check_owner(path, st):
+    if st.st_uid != os.getuid():
+        raise PermissionError(f"{path} is owned by uid {st.st_uid}, not by this user")
+
+
+def secure_socket_dir(socket_path):
+    """Creates the socket's directory if needed and checks that no other user can write to it."""
+    directory = os.path.dirname(os.path.abspath(socket_path))
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    st = os.lstat(directory)
+    if not stat.S_ISDIR(st.st_mode):
+        raise PermissionError(f"{directory} is not a directory")
+    _check_owner(directory, st)
+    if st.st_mode & 0o022:
+        raise PermissionError(f"{directory} is writable by other users")
+
+
+def check_socket_owner(socket_path):
+    """Raises PermissionError unless socket_path is a socket owned by this user."""
+    st = os.lstat(socket_path)
+    if not stat.S_ISSOCK(st.st_mode):
+        raise PermissionError(f"{socket_path} is not a socket")
+    _check_owner(socket_path, st)
+
+
+def _recv_exact(sock, size):
+    data = bytearray()
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError("Embedding service closed the connection")
+        data.extend(chunk)
+    return bytes(data)
+
+
+def send_frame(sock, payload):
+    sock.sendall(LENGTH.pack(len(payload)) + payload)
+
+
+def recv_frame(sock):
+    (size,) = LENGTH.unpack(_recv_exact(sock, LENGTH.size))
+    return _recv_exact(sock, size)
+
+
+class EmbeddingRequestHandler(socketserver.BaseRequestHandler):
+    """Answers embedding requests on one client connection until the client disconnects."""
+
+    def handle(self):
+        while True:
+            try:
+                request = json.loads(recv_frame(self.request))
+            except ConnectionError:
+                return
+
+            try:
+                header, vectors = self.server.dispatch(request)
+            except Exception as e:
+                header, vectors = {"error": str(e)}, []
+
+            # Vectors travel as raw float32 after a small JSON header
+            payload = array("f")
+            for vector in vectors:
+                payload.extend(vector)
+            send_frame(self.request, json.dumps(header).encode("utf-8"))
+            send_frame(self.request, payload.tobytes())
+
+
+class EmbeddingServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Unix socket server holding the one copy of the embedding model on this host."""
+
+    daemon_threads = True
+
+    def __init__(self, socket_path, model_name):
+        from langchain_huggingface import HuggingFaceEmbeddings
+
+        print(f"Loading {model_name}...")
+        self.model_name = model_name
+        self.embeddings = HuggingFaceEmbeddings(model_name=model_name)
+        # The model isn't safe to call from several threads at once
+        self.model_lock = threading.Lock()
+
+        secure_socket_dir(socket_path)
+        # Remove a socket left behind by a daemon that didn't shut down cleanly
+        if os.path.lexists(socket_path):
+            check_socket_owner(socket_path)
+            os.unlink(socket_path)
+        # Create the socket owner-only from the start instead of narrowing it after bind
+        umask = os.umask(0o077)
+        try:
+            super().__init__(socket_path, EmbeddingRequestHandler)
+        finally:
+            os.umask(umask)
+
+    def dispatch(self, request):
+        op = request.get("op")
+        if op == "ping":
+            return {"model": self.model_name}, []
+        if op == "embed_documents":
+            with self.model_lock:
+                vectors = self.embeddings.embed_documents(request["texts"])
+        elif op == "embed_query":
+            with self.model_lock:
+                vectors = [self.embeddings.embed_query(request["text"])]
+        else:
+            raise ValueError(f"Unknown operation: {op}")
+        return {"count": len(vectors), "dim": len(vectors[0]) if vectors else 0}, vectors
+
+
+class EmbeddingServiceClient(Embeddings):
+    """Embeddings implementation that forwards every call to the resident embedding service."""
+
+    def __init__(self, socket_path=DEFAULT_SOCKET, timeout=60):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._sock = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        # Don't send text to a socket another user put at this path
+        check_socket_owner(self.socket_path)
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self.socket_path)
+        return sock
+
+    def _request(self, request):
+        with self._lock:
+            # Reconnect once if the daemon was restarted since the last call
+            for attempt in range(2):
+                try:
+                    if self._sock is None:
+                        self._sock = self._connect()
+                    send_frame(self._sock, json.dumps(request).encode("utf-8"))
+                    header = json.loads(recv_frame(self._sock))
+                    payload = recv_frame(self._sock)
+                    break
+                except ConnectionError:
+                    self.close()
+                    if attempt:
+                        raise
+                except OSError:
+                    # A timeout leaves a half-read reply on the socket, so drop the connection
+                    self.close()
+                    raise
+
+        if "error" in header:
+            raise RuntimeError(f"Embedding service error: {header['error']}")
+        values = array("f")
+        values.frombytes(payload)
+        dim = header.get("dim", 0)
+        return header, [values[i:i + dim].tolist() for i in range(0, len(values), dim)] if dim else []
+
+    def close(self):
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+
+    def ping(self):
+        """Returns the name of the model the service has loaded."""
+        header, _ = self._request({"op": "ping"})
+        return header["model"]
+
+    def embed_documents(self, texts):
+        if not texts:
+            return []
+        _, vectors = self._request({"op": "embed_documents", "texts": list(texts)})
+        return vectors
+
+    def embed_query(self, text):
+        _, vectors = self._request({"op": "embed_query", "text": text})
+        return vectors[0]
+
+
+def get_embeddings(model_name=DEFAULT_MODEL, socket_path=DEFAULT_SOCKET):
+    """Returns a client for the embedding service, or loads the model in-process if it isn't running."""
+    client = EmbeddingServiceClient(socket_path)
+    try:
+        served_model = client.ping()
+    except PermissionError as e:
+        reason = f"Not using the embedding service: {e}"
+    except OSError:
+        reason = f"Embedding service not running at {socket_path}"
+    else:
+        if served_model == model_name:
+            print(f"Using embedding service at {socket_path} ({model_name})")
+            return client
+        reason = f"Embedding service serves {served_model}"
+
+    client.close()
+    print(f"{reason}, loading {model_name} in-process")
+
+    from langchain_huggingface import HuggingFaceEmbeddings
+
+    return HuggingFaceEmbeddings(model_name=model_name)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Resident embedding service on a Unix domain socket")
+    parser.add_argument("--socket", default=DEFAULT_SOCKET, help="Path of the Unix domain socket")
+    parser.add_argument("--model", default=DEFAULT_MODEL, help="sentence-transformers model to serve")
+    args = parser.parse_args()
+
+    server = EmbeddingServer(args.socket, args.model)
+    print(f"Embedding service for {args.model} listening on {args.socket}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nShutting down embedding service")
+    finally:
+        server.server_close()
+        os.unlink(args.socket)
@@ -0,0 +1,349 @@
+import argparse
+import json
+import mmap
+import os
+import shutil
+import sqlite3
+import time
+
+import numpy as np
+
+from db_maintenance import hnsw_params
+
+# Read-only serving snapshots of a Chroma collection for many query workers
+#
+#   python mmap_index.py export db/chroma_db_partitioned_by_source db/serving_by_source
+#   python mmap_index.py prune db/serving_by_source --keep 2
+#
+# Chroma's HNSW segment is deserialized into each process's private memory, so
+# N workers hold N copies of the graph and vectors. A snapshot is a set of flat
+# files that every worker memory-maps read-only, so all of them share one copy
+# through the page cache:
+#
+#   <serving_dir>/CURRENT                      name of the snapshot to serve
+#   <serving_dir>/snapshots/<version>/
+#       manifest.json                          space, dimension, counts
+#       vectors.npy                            float32 vectors grouped by IVF list
+#       norms.npy                              squared norms for l2 distances
+#       centroids.npy, list_offsets.npy        IVF coarse quantizer and list boundaries
+#       records.bin, record_offsets.npy        JSON id/document/metadata per row
+#
+# Exporting writes a new snapshot next to the old ones and then replaces
+# CURRENT atomically; MmapRetriever picks the new one up without a restart.
+#
+# Searches scan every IVF list by default, which returns exactly what a brute
+# force search would. Probing only the nprobe lists closest to the query is
+# faster on large snapshots but can miss neighbours, so pick nprobe from the
+# recall@k that bench_mmap_index.py --nprobe reports for the snapshot.
+
+CURRENT_FILE = "CURRENT"
+SNAPSHOTS_DIR = "snapshots"
+MANIFEST_FILE = "manifest.json"
+SNAPSHOT_FILES = (
+    "vectors.npy", "norms.npy", "centroids.npy", "list_offsets.npy", "records.bin", "record_offsets.npy",
+)
+# Manifest build_partitioned_store() writes next to a partitioned store's collections
+PARTITIONS_FILE = "partitions.json"
+EXPORT_BATCH_SIZE = 1000
+KMEANS_ITERATIONS = 10
+ASSIGN_BATCH_SIZE = 4096
+
+
+def _fsync_dir(directory):
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _nearest_centroids(vectors, centroids):
+    """Returns the index of the closest centroid (squared L2) for each vector."""
+    assignments = np.empty(len(vectors), dtype=np.int64)
+    centroid_norms = (centroids ** 2).sum(axis=1)
+    for start in range(0, len(vectors), ASSIGN_BATCH_SIZE):
+        batch = vectors[start:start + ASSIGN_BATCH_SIZE]
+        assignments[start:start + len(batch)] = np.argmin(centroid_norms[None, :] - 2 * batch @ centroids.T, axis=1)
+    return assignments
+
+
+def train_ivf(vectors, nlist, seed=0):
+    """Clusters the vectors with k-means and returns (centroids, list assignment of each vector)."""
+    if nlist <= 1:
+        return vectors.mean(axis=0, keepdims=True), np.zeros(len(vectors), dtype=np.int64)
+
+    rng = np.random.default_rng(seed)
+    # Train on a sample, which is plenty for a coarse quantizer
+    sample = vectors[rng.choice(len(vectors), size=min(len(vectors), 256 * nlist), replace=False)]
+    centroids = sample[rng.choice(len(sample), size=nlist, replace=False)].copy()
+    for _ in range(KMEANS_ITERATIONS):
+        assignments = _nearest_centroids(sample, centroids)
+        for c in range(nlist):
+            members = sample[assignments == c]
+            if len(members):
+                centroids[c] = members.mean(axis=0)
+            else:
+                # Restart an empty list at a random sample point
+                centroids[c] = sample[rng.integers(len(sample))]
+    return centroids, _nearest_centroids(vectors, centroids)
+
+
+def default_nlist(count):
+    # Below a few thousand vectors a full scan is as fast as probing lists
+    return max(1, int(np.sqrt(count))) if count >= 4096 else 1
+
+
+def write_snapshot(serving_dir, ids, vectors, documents, metadatas, space="l2", nlist=None, keep=3):
+    """Writes a new snapshot, makes it the one served and returns its version."""
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    if space == "cosine":
+        # Store unit vectors so cosine distance is 1 - dot product
+        vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    nlist = min(nlist or default_nlist(len(ids)), len(ids)) or 1
+
+    start = time.perf_counter()
+    centroids, assignments = train_ivf(vectors, nlist)
+    # Group the rows of each list together so probing a list reads one contiguous range
+    order = np.argsort(assignments, kind="stable")
+    list_offsets = np.concatenate([[0], np.cumsum(np.bincount(assignments, minlength=nlist))]).astype(np.int64)
+
+    # Versions sort in the order they were written
+    version = time.strftime("%Y%m%dT%H%M%S") + f".{time.time_ns() // 1_000_000 % 1000:03d}-{os.getpid()}"
+    snapshots_dir = os.path.join(serving_dir, SNAPSHOTS_DIR)
+    tmp_dir = os.path.join(snapshots_dir, f".{version}.tmp")
+    os.makedirs(tmp_dir)
+
+    ordered = vectors[order]
+    np.save(os.path.join(tmp_dir, "vectors.npy"), ordered)
+    np.save(os.path.join(tmp_dir, "norms.npy"), (ordered ** 2).sum(axis=1))
+    np.save(os.path.join(tmp_dir, "centroids.npy"), centroids.astype(np.float32))
+    np.save(os.path.join(tmp_dir, "list_offsets.npy"), list_offsets)
+
+    record_offsets = [0]
+    with open(os.path.join(tmp_dir, "records.bin"), "wb") as f:
+        for row in order:
+            record = {"id": ids[row], "document": documents[row] or "", "metadata": metadatas[row] or {}}
+            f.write(json.dumps(record, ensure_ascii=False).encode("utf-8"))
+            record_offsets.append(f.tell())
+    np.save(os.path.join(tmp_dir, "record_offsets.npy"), np.asarray(record_offsets, dtype=np.int64))
+
+    with open(os.path.join(tmp_dir, MANIFEST_FILE), "w", encoding="utf-8") as f:
+        json.dump(
+            {"version": version, "space": space, "count": len(ids), "dimension": int(vectors.shape[1]),
+             "nlist": int(nlist)},
+            f, indent=2,
+        )
+    for name in os.listdir(tmp_dir):
+        with open(os.path.join(tmp_dir, name), "rb") as f:
+            os.fsync(f.fileno())
+
+    # A snapshot only becomes visible once it is complete
+    os.rename(tmp_dir, os.path.join(snapshots_dir, version))
+    _fsync_dir(snapshots_dir)
+    current_tmp = os.path.join(serving_dir, CURRENT_FILE + ".tmp")
+    with open(current_tmp, "w", encoding="utf-8") as f:
+        f.write(version)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(current_tmp, os.path.join(serving_dir, CURRENT_FILE))
+    _fsync_dir(serving_dir)
+
+    print(
+        f"Wrote snapshot {version} with {len(ids):,} vectors in {nlist} lists "
+        f"to {serving_dir} in {time.perf_counter() - start:.1f}s"
+    )
+    if keep:
+        prune_snapshots(serving_dir, keep=keep)
+    return version
+
+
+def export_collection(store, serving_dir, collection_name=None, nlist=None, keep=3):
+    """Exports a persisted Chroma collection as a new serving snapshot.
+
+    Without a collection name, a store written by build_partitioned_store() is
+    exported as one snapshot of all its partitions, and any other store as its
+    default "langchain" collection.
+    """
+    import chromadb
+
+    partitions_path = os.path.join(store, PARTITIONS_FILE)
+    if collection_name:
+        collection_names = [collection_name]
+    elif os.path.exists(partitions_path):
+        with open(partitions_path, encoding="utf-8") as f:
+            collection_names = list(json.load(f)["partitions"].values())
+    else:
+        collection_names = ["langchain"]
+
+    conn = sqlite3.connect(f"file:{os.path.join(store, 'chroma.sqlite3')}?mode=ro", uri=True)
+    spaces = set()
+    for name in collection_names:
+        row = conn.execute("SELECT id FROM collections WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            raise ValueError(f"{store} has no collection named '{name}'")
+        spaces.add(hnsw_params(conn, row[0])["space"])
+    conn.close()
+    if len(spaces) > 1:
+        raise ValueError(f"Collections in {store} use different distance spaces: {sorted(spaces)}")
+
+    client = chromadb.PersistentClient(path=store)
+    ids, vectors, documents, metadatas = [], [], [], []
+    for name in collection_names:
+        collection = client.get_collection(name)
+        offset = 0
+        while True:
+            rows = collection.get(
+                include=["embeddings", "documents", "metadatas"], limit=EXPORT_BATCH_SIZE, offset=offset
+            )
+            if not rows["ids"]:
+                break
+            ids.extend(rows["ids"])
+            vectors.extend(rows["embeddings"])
+            documents.extend(rows["documents"])
+            metadatas.extend(rows["metadatas"])
+            offset += len(rows["ids"])
+    if not ids:
+        raise ValueError(f"No embeddings to export from {store}")
+
+    return write_snapshot(serving_dir, ids, np.asarray(vectors), documents, metadatas, space=spaces.pop(),
+                          nlist=nlist, keep=keep)
+
+
+def current_version(serving_dir):
+    with open(os.path.join(serving_dir, CURRENT_FILE), encoding="utf-8") as f:
+        return f.read().strip()
+
+
+def prune_snapshots(serving_dir, keep=3):
+    """Deletes all but the newest snapshots, never the one being served.
+
+    Workers that still have a deleted snapshot mapped keep reading it until
+    they switch, as the files only go away once the last mapping is closed.
+    """
+    snapshots_dir = os.path.join(serving_dir, SNAPSHOTS_DIR)
+    current = current_version(serving_dir)
+    versions = sorted(name for name in os.listdir(snapshots_dir) if not name.startswith("."))
+    for version in versions[:-keep] if keep else versions:
+        if version != current:
+            shutil.rmtree(os.path.join(snapshots_dir, version))
+            print(f"Removed snapshot {version}")
+
+    # Half-written snapshots left by exports that crashed
+    for name in os.listdir(snapshots_dir):
+        if name.startswith(".") and name.endswith(".tmp") and not _export_running(name[1:-len(".tmp")]):
+            shutil.rmtree(os.path.join(snapshots_dir, name), ignore_errors=True)
+            print(f"Removed unfinished snapshot {name}")
+
+
+def _export_running(version):
+    """Returns True if the process writing a snapshot version is still running on this host."""
+    try:
+        pid = int(version.rsplit("-", 1)[1])
+    except (IndexError, ValueError):
+        return False
+    try:
+        # Signal 0 only checks that the process exists
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class MmapIndex:
+    """Searches one snapshot through read-only memory maps of its files."""
+
+    def __init__(self, snapshot_dir, nprobe=None):
+        with open(os.path.join(snapshot_dir, MANIFEST_FILE), encoding="utf-8") as f:
+            self.manifest = json.load(f)
+        self.version = self.manifest["version"]
+        self.space = self.manifest["space"]
+        self.nprobe = nprobe
+
+        def load(name):
+            return np.load(os.path.join(snapshot_dir, name), mmap_mode="r")
+
+        self.vectors = load("vectors.npy")
+        self.norms = load("norms.npy")
+        self.centroids = np.array(load("centroids.npy"))
+        self.list_offsets = np.array(load("list_offsets.npy"))
+        self.record_offsets = load("record_offsets.npy")
+        with open(os.path.join(snapshot_dir, "records.bin"), "rb") as f:
+            # Unmapped when the index is garbage collected, so queries still
+            # running on a replaced snapshot finish normally
+            self.records = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __len__(self):
+        return self.manifest["count"]
+
+    def _probe_lists(self, query, nprobe):
+        nlist = len(self.centroids)
+        if nprobe is None or nprobe >= nlist:
+            return range(nlist)
+        if self.space == "ip":
+            scores = -(self.centroids @ query)
+        else:
+            scores = ((self.centroids - query) ** 2).sum(axis=1)
+        return np.argpartition(scores, nprobe - 1)[:nprobe]
+
+    def search(self, query, k=3, nprobe=None):
+        """Returns the k nearest (row, distance) pairs, with Chroma's distance for the snapshot's space.
+
+        nprobe limits the search to that many IVF lists; None scans all of them.
+        """
+        query = np.asarray(query, dtype=np.float32)
+        if self.space == "cosine":
+            query = query / max(np.linalg.norm(query), 1e-12)
+
+        rows, distances = [], []
+        for c in self._probe_lists(query, nprobe or self.nprobe):
+            start, end = self.list_offsets[c], self.list_offsets[c + 1]
+            if start == end:
+                continue
+            dots = self.vectors[start:end] @ query
+            if self.space == "l2":
+                distances.append(self.norms[start:end] - 2 * dots + query @ query)
+            else:
+                distances.append(1.0 - dots)
+            rows.append(np.arange(start, end))
+        if not rows:
+            return []
+
+        rows, distances = np.concatenate(rows), np.concatenate(distances)
+        if len(rows) > k:
+            top = np.argpartition(distances, k - 1)[:k]
+            rows, distances = rows[top], distances[top]
+        order = np.argsort(distances)
+        return [(int(rows[i]), float(distances[i])) for i in order]
+
+    def record(self, row):
+        """Returns the id, document and metadata stored for a row."""
+        return json.loads(self.records[self.record_offsets[row]:self.record_offsets[row + 1]])
+
+
+def open_current(serving_dir, nprobe=None):
+    version = current_version(serving_dir)
+    return MmapIndex(os.path.join(serving_dir, SNAPSHOTS_DIR, version), nprobe=nprobe)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export and manage memory-mapped serving snapshots")
+    commands = parser.add_subparsers(dest="command", required=True)
+    export_parser = commands.add_parser("export", help="Export a Chroma collection as a new snapshot")
+    export_parser.add_argument("store", help="Persist directory of the Chroma store")
+    export_parser.add_argument("serving_dir", help="Directory holding the snapshots")
+    export_parser.add_argument(
+        "--collection", help="Collection name (default: every partition of a partitioned store, else langchain)"
+    )
+    export_parser.add_argument("--nlist", type=int, help="Number of IVF lists (default: sqrt of the count)")
+    export_parser.add_argument("--keep", type=int, default=3, help="Snapshots to keep (default: 3)")
+    prune_parser = commands.add_parser("prune", help="Delete old snapshots")
+    prune_parser.add_argument("serving_dir", help="Directory holding the snapshots")
+    prune_parser.add_argument("--keep", type=int, default=3, help="Snapshots to keep (default: 3)")
+    args = parser.parse_args()
+
+    if args.command == "export":
+        export_collection(args.store, args.serving_dir, args.collection, nlist=args.nlist, keep=args.keep)
+    else:
+        prune_snapshots(args.serving_dir, keep=args.keep)
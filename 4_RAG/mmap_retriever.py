@@ -0,0 +1,70 @@
+import os
+import time
+from typing import Any, List, Optional
+
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from pydantic import PrivateAttr
+
+from mmap_index import CURRENT_FILE, current_version, open_current
+
+
+class MmapRetriever(BaseRetriever):
+    """Retriever over the snapshot a serving directory's CURRENT file points to.
+
+    Every worker maps the same read-only files, so the index is held in memory
+    once however many workers serve it. CURRENT is checked at most every
+    reload_interval seconds and a newly exported snapshot is swapped in
+    between queries. Leave nprobe as None for exact results, or set it to
+    probe only that many IVF lists per query.
+    """
+
+    serving_dir: str
+    embeddings: Any
+    k: int = 3
+    nprobe: Optional[int] = None
+    reload_interval: float = 1.0
+
+    _index: Any = PrivateAttr(default=None)
+    _current_mtime: Optional[int] = PrivateAttr(default=None)
+    _checked_at: float = PrivateAttr(default=0.0)
+
+    def index(self):
+        """Returns the index of the current snapshot, switching to a newer one if it was exported."""
+        now = time.monotonic()
+        if self._index is not None and now - self._checked_at < self.reload_interval:
+            return self._index
+        self._checked_at = now
+
+        mtime = os.stat(os.path.join(self.serving_dir, CURRENT_FILE)).st_mtime_ns
+        if self._index is None or (
+            mtime != self._current_mtime and current_version(self.serving_dir) != self._index.version
+        ):
+            # Queries already running keep their reference to the old index
+            index = open_current(self.serving_dir, nprobe=self.nprobe)
+            if self._index is not None:
+                print(f"Switched from snapshot {self._index.version} to {index.version}")
+            self._index = index
+        self._current_mtime = mtime
+        return self._index
+
+    def search(self, query, k=None):
+        """Returns the top-k (document, distance) pairs."""
+        index = self.index()
+        results = []
+        for row, distance in index.search(self.embeddings.embed_query(query), k=k or self.k):
+            record = index.record(row)
+            results.append(
+                (Document(id=record["id"], page_content=record["document"], metadata=record["metadata"]), distance)
+            )
+        return results
+
+    def _get_relevant_documents(
+        self,
+        query: str,
+        *,
+        run_manager: CallbackManagerForRetrieverRun,
+        k: Optional[int] = None,
+    ) -> List[Document]:
+        return [doc for doc, _ in self.search(query, k=k)]
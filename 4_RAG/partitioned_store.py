@@ -0,0 +1,201 @@
+import json
+import os
+import re
+import hashlib
+import heapq
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from langchain_chroma import Chroma
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from bulk_loader import _atomic_write, bulk_load
+
+# The manifest maps every partition value to the Chroma collection holding it
+MANIFEST_FILE = "partitions.json"
+MISSING_PARTITION = "__missing__"
+
+
+def partition_collection_name(value):
+    """Builds a valid Chroma collection name for a partition value."""
+    # Chroma only allows [a-zA-Z0-9._-] and 3-63 characters, so keep a readable
+    # prefix of the value and add a short hash to keep the names unique
+    readable = re.sub(r"[^a-zA-Z0-9_-]", "_", str(value))[:40]
+    digest = hashlib.sha1(str(value).encode("utf-8")).hexdigest()[:8]
+    return f"p_{readable}_{digest}"
+
+
+def partition_documents(docs, partition_key):
+    """Groups documents by the value of a metadata key."""
+    partitions = {}
+    for doc in docs:
+        value = doc.metadata.get(partition_key, MISSING_PARTITION)
+        partitions.setdefault(str(value), []).append(doc)
+    return partitions
+
+
+def is_partitioned_store_complete(persist_directory):
+    """Returns True once every partition is loaded and the manifest is written."""
+    return os.path.exists(os.path.join(persist_directory, MANIFEST_FILE))
+
+
+def build_partitioned_store(
+    docs, embeddings, persist_directory, partition_key="source", batch_size=64, defer_index=False
+):
+    """Writes one Chroma collection per partition value and a manifest describing them.
+
+    Each partition is written with bulk_load(), so an interrupted build resumes
+    where it stopped and skips the partitions that are already complete.
+    """
+    os.makedirs(persist_directory, exist_ok=True)
+    partitions = partition_documents(docs, partition_key)
+    manifest = {"partition_key": partition_key, "partitions": {}}
+
+    for value, partition_docs in partitions.items():
+        collection_name = partition_collection_name(value)
+        print(f"Partition '{value}': {len(partition_docs)} chunks -> {collection_name}")
+        bulk_load(
+            partition_docs,
+            embeddings,
+            persist_directory,
+            collection_name=collection_name,
+            batch_size=batch_size,
+            defer_index=defer_index,
+        )
+        manifest["partitions"][value] = collection_name
+
+    # Write the manifest last so a store without one is never mistaken for a complete store,
+    # and atomically so a crash can't leave a truncated one behind
+    _atomic_write(
+        os.path.join(persist_directory, MANIFEST_FILE),
+        json.dumps(manifest, indent=2).encode("utf-8"),
+    )
+    return manifest
+
+
+def load_partitioned_store(persist_directory, embeddings, k=3, max_workers=8):
+    """Opens every partition listed in the manifest and returns a retriever over them."""
+    with open(os.path.join(persist_directory, MANIFEST_FILE), encoding="utf-8") as f:
+        manifest = json.load(f)
+
+    stores = {
+        value: Chroma(
+            collection_name=collection_name,
+            persist_directory=persist_directory,
+            embedding_function=embeddings,
+        )
+        for value, collection_name in manifest["partitions"].items()
+    }
+    return PartitionedRetriever(
+        stores=stores,
+        embeddings=embeddings,
+        partition_key=manifest["partition_key"],
+        k=k,
+        max_workers=max_workers,
+    )
+
+
+def _select_partitions(condition, partitions):
+    """Returns the partition values matching a filter condition on the partition key."""
+    if not isinstance(condition, dict):
+        return [str(condition)] if str(condition) in partitions else []
+
+    selected = set(partitions)
+    for operator, operand in condition.items():
+        if operator == "$eq":
+            selected &= {str(operand)}
+        elif operator == "$ne":
+            selected -= {str(operand)}
+        elif operator == "$in":
+            selected &= {str(value) for value in operand}
+        elif operator == "$nin":
+            selected -= {str(value) for value in operand}
+        else:
+            raise ValueError(f"Unsupported operator on the partition key: {operator}")
+    return [value for value in partitions if value in selected]
+
+
+def _combine_conditions(conditions):
+    """Turns a list of single-key conditions back into a Chroma `where` filter."""
+    if not conditions:
+        return None
+    if len(conditions) == 1:
+        return conditions[0]
+    return {"$and": conditions}
+
+
+def split_filter(metadata_filter, partition_key, partitions):
+    """Splits a metadata filter into the partitions to search and the filter left for each shard."""
+    if not metadata_filter:
+        return list(partitions), None
+
+    # Flatten the filter into single-key conditions joined by AND
+    if set(metadata_filter) == {"$and"}:
+        conditions = list(metadata_filter["$and"])
+    elif "$or" in metadata_filter:
+        # An OR can't be pushed down per shard, so every shard gets the full filter
+        return list(partitions), metadata_filter
+    else:
+        conditions = [{key: value} for key, value in metadata_filter.items()]
+
+    selected = list(partitions)
+    remaining = []
+    for condition in conditions:
+        if set(condition) == {partition_key}:
+            matching = _select_partitions(condition[partition_key], partitions)
+            selected = [value for value in selected if value in matching]
+        else:
+            remaining.append(condition)
+    return selected, _combine_conditions(remaining)
+
+
+class PartitionedRetriever(BaseRetriever):
+    """Retriever that pushes metadata filters down to one Chroma collection per partition."""
+
+    stores: Dict[str, Any]
+    embeddings: Any
+    partition_key: str = "source"
+    k: int = 3
+    filter: Optional[Dict[str, Any]] = None
+    max_workers: int = 8
+
+    def search(self, query, k=None, filter=None):
+        """Returns the top-k (document, distance) pairs across the partitions selected by the filter."""
+        k = k or self.k
+        partitions, shard_filter = split_filter(
+            filter if filter is not None else self.filter, self.partition_key, self.stores
+        )
+        if not partitions:
+            return []
+
+        # Embed the query once and reuse the vector for every shard
+        query_embedding = self.embeddings.embed_query(query)
+
+        def search_partition(value):
+            return self.stores[value].similarity_search_by_vector_with_relevance_scores(
+                query_embedding, k=k, filter=shard_filter
+            )
+
+        if len(partitions) == 1:
+            results = [search_partition(partitions[0])]
+        else:
+            # Fan out across the shards in parallel, each shard returns its own top-k
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(partitions))) as pool:
+                results = list(pool.map(search_partition, partitions))
+
+        # Chroma returns distances, so the global top-k are the k smallest
+        return heapq.nsmallest(
+            k, (pair for shard_results in results for pair in shard_results), key=lambda pair: pair[1]
+        )
+
+    def _get_relevant_documents(
+        self,
+        query: str,
+        *,
+        run_manager: CallbackManagerForRetrieverRun,
+        k: Optional[int] = None,
+        filter: Optional[Dict[str, Any]] = None,
+    ) -> List[Document]:
+        return [doc for doc, _ in self.search(query, k=k, filter=filter)]
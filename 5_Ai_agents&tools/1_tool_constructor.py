@@ -2,21 +2,32 @@
 
 # Import necessary libraries
 import os
-from dotenv import load_dotenv
-from langchain import hub
-from langchain.agents import AgentExecutor, create_structured_chat_agent
-from langchain_core.tools import Tool
-from langchain_huggingface import HuggingFaceEndpoint
+import sys
+from functools import lru_cache
 
-# Load environment variables from .env file
-load_dotenv()
+# Make the shared helpers in the repository root importable
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-# Get HuggingFace API token
-hf_token = os.getenv("HUGGINGFACEHUB_API_TOKEN")
-if not hf_token:
-    print("Error: HUGGINGFACEHUB_API_TOKEN not found in .env file")
-    hf_token = input("Please enter your HuggingFace API token: ")
-    os.environ["HUGGINGFACEHUB_API_TOKEN"] = hf_token
+
+@lru_cache(maxsize=None)
+def load_environment():
+    from dotenv import load_dotenv
+
+    # Load environment variables from .env file
+    load_dotenv()
+
+
+def get_hf_token():
+    """Returns the HuggingFace API token from .env, asking for it if it isn't set."""
+    load_environment()
+
+    # Get HuggingFace API token
+    hf_token = os.getenv("HUGGINGFACEHUB_API_TOKEN")
+    if not hf_token:
+        print("Error: HUGGINGFACEHUB_API_TOKEN not found in .env file")
+        hf_token = input("Please enter your HuggingFace API token: ")
+        os.environ["HUGGINGFACEHUB_API_TOKEN"] = hf_token
+    return hf_token
 
 
 # Functions for the tools
@@ -39,72 +50,115 @@ def concatenate_strings(a_and_b):
         return "Error: Please provide two strings separated by a comma."
 
 
-# Create tools using the Tool constructor approach
-tools = [
-    Tool(
-        name="GreetUser",
-        func=greet_user,
-        description="Greets the user by name. Input should be a name.",
-    ),
-    Tool(
-        name="ReverseString",
-        func=reverse_string,
-        description="Reverses the given string. Input should be a string to reverse.",
-    ),
-    Tool(
-        name="ConcatenateStrings",
-        func=concatenate_strings,
-        description="Concatenates two strings together. Input should be two strings separated by a comma, like 'hello,world'.",
-    ),
-]
-
-# Initialize a HuggingFace model with more conservative settings
-llm = HuggingFaceEndpoint(
-    endpoint_url="https://api-inference.huggingface.co/models/mistralai/Mistral-7B-Instruct-v0.3",
-    task="text-generation",
-    temperature=0.1,
-    max_new_tokens=256,
-    do_sample=False,
-    huggingfacehub_api_token=hf_token,
-    model_kwargs={
-        "stop": ["Human:", "Assistant:"]
-    },
-    timeout=30
-)
-
-# Pull the prompt template from the hub
-prompt = hub.pull("hwchase17/structured-chat-agent")
-
-# Create the agent using the create_structured_chat_agent function
-agent = create_structured_chat_agent(
-    llm=llm,
-    tools=tools,
-    prompt=prompt,
-)
-
-# Create the agent executor with more conservative settings
-agent_executor = AgentExecutor.from_agent_and_tools(
-    agent=agent,
-    tools=tools,
-    verbose=True,
-    handle_parsing_errors=True,
-    max_iterations=2,
-    return_intermediate_steps=False
-)
-
-# Test with a simple example first
-try:
-    print("Testing with a simple greeting...")
-    response = agent_executor.invoke({"input": "Greet Alice"})
-    print("Response:", response["output"])
-    
-    print("\nTesting with string reversal...")
-    response = agent_executor.invoke({"input": "Reverse the string 'hello'"})
-    print("Response:", response["output"])
-    
-    print("\nTesting with string concatenation...")
-    response = agent_executor.invoke({"input": "Concatenate 'hello' and 'world'"})
-    print("Response:", response["output"])
-    
-except Exception as e:
-    print(f"An error occurred: {str(e)}")
+def get_tools():
+    from langchain_core.tools import Tool
+
+    # Create tools using the Tool constructor approach
+    return [
+        Tool(
+            name="GreetUser",
+            func=greet_user,
+            description="Greets the user by name. Input should be a name.",
+        ),
+        Tool(
+            name="ReverseString",
+            func=reverse_string,
+            description="Reverses the given string. Input should be a string to reverse.",
+        ),
+        Tool(
+            name="ConcatenateStrings",
+            func=concatenate_strings,
+            description="Concatenates two strings together. Input should be two strings separated by a comma, like 'hello,world'.",
+        ),
+    ]
+
+
+@lru_cache(maxsize=None)
+def get_llm():
+    load_environment()
+
+    # Initialize a HuggingFace model with more conservative settings
+    if os.getenv("LLM_BACKEND") == "local":
+        from local_llm import LocalLLM
+
+        # Run a small instruct model on this machine's CPU instead of the inference endpoint
+        # Prompt prefixes shared between calls, like the agent's tool instructions, are only prefilled once
+        return LocalLLM(
+            model_id=os.getenv("LOCAL_LLM_MODEL", "Qwen/Qwen2.5-0.5B-Instruct"),
+            task="text-generation",
+            max_new_tokens=256,
+            do_sample=False,
+            stop=["Human:", "Assistant:"],
+        )
+
+    from langchain_huggingface import HuggingFaceEndpoint
+
+    from resilient_runnable import ResilientRunnable
+
+    # ResilientRunnable hedges slow calls, retries 429/5xx with backoff and stops calling a failing endpoint
+    return ResilientRunnable(HuggingFaceEndpoint(
+        endpoint_url="https://api-inference.huggingface.co/models/mistralai/Mistral-7B-Instruct-v0.3",
+        task="text-generation",
+        temperature=0.1,
+        max_new_tokens=256,
+        do_sample=False,
+        huggingfacehub_api_token=get_hf_token(),
+        model_kwargs={
+            "stop": ["Human:", "Assistant:"]
+        },
+        timeout=30
+    ), endpoint="huggingface/mistralai/Mistral-7B-Instruct-v0.3")
+
+
+@lru_cache(maxsize=None)
+def get_agent_executor():
+    """Builds the structured chat agent on first use."""
+    from langchain import hub
+    from langchain.agents import AgentExecutor, create_structured_chat_agent
+
+    tools = get_tools()
+
+    # Pull the prompt template from the hub
+    prompt = hub.pull("hwchase17/structured-chat-agent")
+
+    # Create the agent using the create_structured_chat_agent function
+    agent = create_structured_chat_agent(
+        llm=get_llm(),
+        tools=tools,
+        prompt=prompt,
+    )
+
+    # Create the agent executor with more conservative settings
+    return AgentExecutor.from_agent_and_tools(
+        agent=agent,
+        tools=tools,
+        verbose=True,
+        handle_parsing_errors=True,
+        max_iterations=2,
+        return_intermediate_steps=False
+    )
+
+
+def main():
+    agent_executor = get_agent_executor()
+
+    # Test with a simple example first
+    try:
+        print("Testing with a simple greeting...")
+        response = agent_executor.invoke({"input": "Greet Alice"})
+        print("Response:", response["output"])
+
+        print("\nTesting with string reversal...")
+        response = agent_executor.invoke({"input": "Reverse the string 'hello'"})
+        print("Response:", response["output"])
+
+        print("\nTesting with string concatenation...")
+        response = agent_executor.invoke({"input": "Concatenate 'hello' and 'world'"})
+        print("Response:", response["output"])
+
+    except Exception as e:
+        print(f"An error occurred: {str(e)}")
+
+
+if __name__ == "__main__":
+    main()
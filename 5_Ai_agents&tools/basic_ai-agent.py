@@ -1,19 +1,30 @@
-from dotenv import load_dotenv
 import os
-from langchain import hub
-from langchain.agents import (AgentExecutor, create_react_agent)
-from langchain_core.tools import Tool
-from langchain_huggingface import HuggingFaceEndpoint
+import sys
+from functools import lru_cache
 
-# Load environment variables from .env
-load_dotenv()
+# Make the shared helpers in the repository root importable
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-# Get HuggingFace API token
-hf_token = os.getenv("HUGGINGFACEHUB_API_TOKEN")
-if not hf_token:
-    print("Error: HUGGINGFACEHUB_API_TOKEN not found in .env file")
-    hf_token = input("Please enter your HuggingFace API token: ")
-    os.environ["HUGGINGFACEHUB_API_TOKEN"] = hf_token
+
+@lru_cache(maxsize=None)
+def load_environment():
+    from dotenv import load_dotenv
+
+    # Load environment variables from .env
+    load_dotenv()
+
+
+def get_hf_token():
+    """Returns the HuggingFace API token from .env, asking for it if it isn't set."""
+    load_environment()
+
+    # Get HuggingFace API token
+    hf_token = os.getenv("HUGGINGFACEHUB_API_TOKEN")
+    if not hf_token:
+        print("Error: HUGGINGFACEHUB_API_TOKEN not found in .env file")
+        hf_token = input("Please enter your HuggingFace API token: ")
+        os.environ["HUGGINGFACEHUB_API_TOKEN"] = hf_token
+    return hf_token
 
 
 def get_current_time(*args, **kwargs):
@@ -23,45 +34,80 @@ def get_current_time(*args, **kwargs):
     return now.strftime("%I:%M %p")  # Format the time as desired
 
 
-# list of tools
-tools = [
-    Tool(
-        name="Get Current Time",
-        func=get_current_time,
-        description="Useful for when you need to know the current time",
-    )
-]
+@lru_cache(maxsize=None)
+def get_llm():
+    load_environment()
+
+    # Create a HuggingFace model for text generation
+    if os.getenv("LLM_BACKEND") == "local":
+        from local_llm import LocalLLM
+
+        # Run a small instruct model on this machine's CPU instead of the inference endpoint
+        # Prompt prefixes shared between calls, like the agent's tool instructions, are only prefilled once
+        return LocalLLM(
+            model_id=os.getenv("LOCAL_LLM_MODEL", "Qwen/Qwen2.5-0.5B-Instruct"),
+            task="text-generation",
+            max_new_tokens=512,
+            temperature=0.7,
+            do_sample=True,
+            top_k=50,
+            top_p=0.95,
+        )
 
+    from langchain_huggingface import HuggingFaceEndpoint
 
-prompt = hub.pull("hwchase17/react")
+    from resilient_runnable import ResilientRunnable
 
+    # ResilientRunnable hedges slow calls, retries 429/5xx with backoff and stops calling a failing endpoint
+    return ResilientRunnable(HuggingFaceEndpoint(
+        endpoint_url="https://api-inference.huggingface.co/models/mistralai/Mistral-7B-Instruct-v0.3",
+        task="text-generation",
+        temperature=0.7,
+        max_new_tokens=512,
+        do_sample=True,
+        top_k=50,
+        top_p=0.95,
+        huggingfacehub_api_token=get_hf_token()
+    ), endpoint="huggingface/mistralai/Mistral-7B-Instruct-v0.3")
+
+
+@lru_cache(maxsize=None)
+def get_agent_executor():
+    """Builds the ReAct agent on first use; this pulls its prompt from the hub."""
+    from langchain import hub
+    from langchain.agents import (AgentExecutor, create_react_agent)
+    from langchain_core.tools import Tool
+
+    # list of tools
+    tools = [
+        Tool(
+            name="Get Current Time",
+            func=get_current_time,
+            description="Useful for when you need to know the current time",
+        )
+    ]
+
+    prompt = hub.pull("hwchase17/react")
+
+    # Create the ReAct agent using the create_react_agent function
+    agent = create_react_agent(
+        llm=get_llm(),
+        tools=tools,
+        prompt=prompt,
+        stop_sequence=True
+
+    )
 
-# Create a HuggingFace model for text generation
-llm = HuggingFaceEndpoint(
-    endpoint_url="https://api-inference.huggingface.co/models/mistralai/Mistral-7B-Instruct-v0.3",
-    task="text-generation",
-    temperature=0.7,
-    max_new_tokens=512,
-    do_sample=True,
-    top_k=50,
-    top_p=0.95,
-    huggingfacehub_api_token=hf_token
-)
+    # Create an agent executor from the agent and tools
+    return AgentExecutor.from_agent_and_tools(
+        agent=agent, tools=tools, verbose=True)
 
-# Create the ReAct agent using the create_react_agent function
-agent = create_react_agent(
-    llm=llm,
-    tools=tools,
-    prompt=prompt,
-    stop_sequence=True
-   
-)
 
-# Create an agent executor from the agent and tools
-agent_executor = AgentExecutor.from_agent_and_tools(
-    agent=agent, tools=tools, verbose=True)
+def main():
+    # Run the agent with a test query
+    response = get_agent_executor().invoke({"input": "what time is it?"})
+    print(response)
 
 
-# Run the agent with a test query
-response = agent_executor.invoke({"input": "what time is it?"})
-print(response)
+if __name__ == "__main__":
+    main()
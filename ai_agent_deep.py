@@ -1,27 +1,32 @@
-from dotenv import load_dotenv
-from langchain import hub
-from langchain.agents import AgentExecutor, create_structured_chat_agent
-from langchain.memory import ConversationBufferMemory
-from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
-from langchain_core.tools import StructuredTool
-from langchain_huggingface import HuggingFaceEndpoint
-from pydantic import BaseModel, Field
 import os
 import logging
+from functools import lru_cache
 
-# Set up logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Load environment variables from .env file
-load_dotenv()
+# Initial system message to set the context for the chat
+initial_message = "You are an AI assistant that can provide helpful answers using available tools.\nIf you are unable to answer, you can use the following tools: Time and Wikipedia."
+
+
+@lru_cache(maxsize=None)
+def load_environment():
+    from dotenv import load_dotenv
+
+    # Load environment variables from .env file
+    load_dotenv()
+
+
+def get_hf_token():
+    """Returns the HuggingFace API token from .env, asking for it if it isn't set."""
+    load_environment()
 
-# Get HuggingFace API token
-hf_token = os.getenv("HUGGINGFACEHUB_API_TOKEN")
-if not hf_token:
-    print("Error: HUGGINGFACEHUB_API_TOKEN not found in .env file")
-    hf_token = input("Please enter your HuggingFace API token: ")
-    os.environ["HUGGINGFACEHUB_API_TOKEN"] = hf_token
+    # Get HuggingFace API token
+    hf_token = os.getenv("HUGGINGFACEHUB_API_TOKEN")
+    if not hf_token:
+        print("Error: HUGGINGFACEHUB_API_TOKEN not found in .env file")
+        hf_token = input("Please enter your HuggingFace API token: ")
+        os.environ["HUGGINGFACEHUB_API_TOKEN"] = hf_token
+    return hf_token
 
 
 # Define Tools
@@ -48,119 +53,204 @@ def search_wikipedia(query):
         return error_msg
 
 
-# Define the tools that the agent can use
-
-# Define schema for Wikipedia tool
-class WikipediaInput(BaseModel):
-    query: str = Field(description="The search query to look up on Wikipedia")
-
-tools = [
-    StructuredTool.from_function(
-        func=get_current_time,
-        name="Time",
-        description="Useful for when you need to know the current time.",
-    ),
-    StructuredTool.from_function(
-        func=search_wikipedia,
-        name="Wikipedia",
-        description="Useful for when you need to know information about a topic.",
-        args_schema=WikipediaInput,
-    ),
-]
-
-# Load the correct JSON Chat Prompt from the hub
-prompt = hub.pull("hwchase17/structured-chat-agent")
-
-# Initialize a HuggingFace model
-llm = HuggingFaceEndpoint(
-    endpoint_url="https://api-inference.huggingface.co/models/mistralai/Mistral-7B-Instruct-v0.3",
-    task="text-generation",
-    temperature=0.1,
-    max_new_tokens=512,
-    do_sample=True,
-    top_k=1,
-    top_p=0.9,
-    repetition_penalty=1.2,
-    huggingfacehub_api_token=hf_token,
-    model_kwargs={
-        "stop": ["Human:", "Assistant:", "User:"]
-    }
-)
-
-# Create a structured Chat Agent with Conversation Buffer Memory
-memory = ConversationBufferMemory(
-    memory_key="chat_history", 
-    return_messages=True
-)
-
-# Create the agent with better error handling
-agent = create_structured_chat_agent(
-    llm=llm, 
-    tools=tools, 
-    prompt=prompt
-)
-
-# AgentExecutor with improved configuration
-agent_executor = AgentExecutor.from_agent_and_tools(
-    agent=agent,
-    tools=tools,
-    verbose=True,
-    memory=memory,
-    handle_parsing_errors=True,
-    max_iterations=2,
-    early_stopping_method="generate",
-    return_intermediate_steps=False
-)
+@lru_cache(maxsize=None)
+def get_offline_wikipedia():
+    # Set WIKIPEDIA_INDEX to an index built with offline_wikipedia.py to answer
+    # Wikipedia lookups locally instead of calling the live API
+    load_environment()
+    wikipedia_index = os.getenv("WIKIPEDIA_INDEX")
+    if not wikipedia_index:
+        return None
 
-# Initial system message to set the context for the chat
-# SystemMessage is used to define a message from the system to the agent, setting initial instructions or context
-initial_message = "You are an AI assistant that can provide helpful answers using available tools.\nIf you are unable to answer, you can use the following tools: Time and Wikipedia."
-memory.chat_memory.add_message(SystemMessage(content=initial_message))
+    from offline_wikipedia import OfflineWikipedia
+
+    return OfflineWikipedia(wikipedia_index)
 
-# Chat Loop to interact with the user
-while True:
+
+def search_wikipedia_offline(query):
+    """Searches the local Wikipedia index and returns the summary of the best match."""
     try:
-        user_input = input("User: ")
-        if user_input.lower() in ["exit", "quit", "bye"]:
-            print("Bot: Goodbye!")
-            break
+        # Limit to two sentences for brevity
+        result = get_offline_wikipedia().summary(query, sentences=2)
+        logger.info(f"Offline Wikipedia result for '{query}': {result}")
+        return result
+    except Exception as e:
+        error_msg = f"I couldn't find any information on that. Error: {str(e)}"
+        logger.error(f"Offline Wikipedia search error for '{query}': {error_msg}")
+        return error_msg
+
+
+def wikipedia_search_function():
+    """Returns the offline lookup if a local index is configured, otherwise the live one."""
+    return search_wikipedia_offline if get_offline_wikipedia() else search_wikipedia
+
+
+def get_tools():
+    from langchain_core.tools import StructuredTool
+    from pydantic import BaseModel, Field
+
+    # Define the tools that the agent can use
+
+    # Define schema for Wikipedia tool
+    class WikipediaInput(BaseModel):
+        query: str = Field(description="The search query to look up on Wikipedia")
+
+    return [
+        StructuredTool.from_function(
+            func=get_current_time,
+            name="Time",
+            description="Useful for when you need to know the current time.",
+        ),
+        StructuredTool.from_function(
+            func=wikipedia_search_function(),
+            name="Wikipedia",
+            description="Useful for when you need to know information about a topic.",
+            args_schema=WikipediaInput,
+        ),
+    ]
+
+
+@lru_cache(maxsize=None)
+def get_llm():
+    load_environment()
 
-        # Add the user's message to the conversation memory
-        memory.chat_memory.add_message(HumanMessage(content=user_input))
+    # Initialize a HuggingFace model
+    if os.getenv("LLM_BACKEND") == "local":
+        from local_llm import LocalLLM
 
-        # Log the user input
-        logger.info(f"User input: {user_input}")
+        # Run a small instruct model on this machine's CPU instead of the inference endpoint
+        # Prompt prefixes shared between calls, like the agent's tool instructions, are only prefilled once
+        return LocalLLM(
+            model_id=os.getenv("LOCAL_LLM_MODEL", "Qwen/Qwen2.5-0.5B-Instruct"),
+            task="text-generation",
+            max_new_tokens=512,
+            temperature=0.1,
+            do_sample=True,
+            top_k=1,
+            top_p=0.9,
+            repetition_penalty=1.2,
+            stop=["Human:", "Assistant:", "User:"],
+        )
 
-        # Invoke the agent with the user input and the current chat history
+    from langchain_huggingface import HuggingFaceEndpoint
+
+    from resilient_runnable import ResilientRunnable
+
+    # ResilientRunnable hedges slow calls, retries 429/5xx with backoff and stops calling a failing endpoint
+    return ResilientRunnable(HuggingFaceEndpoint(
+        endpoint_url="https://api-inference.huggingface.co/models/mistralai/Mistral-7B-Instruct-v0.3",
+        task="text-generation",
+        temperature=0.1,
+        max_new_tokens=512,
+        do_sample=True,
+        top_k=1,
+        top_p=0.9,
+        repetition_penalty=1.2,
+        huggingfacehub_api_token=get_hf_token(),
+        model_kwargs={
+            "stop": ["Human:", "Assistant:", "User:"]
+        }
+    ), endpoint="huggingface/mistralai/Mistral-7B-Instruct-v0.3")
+
+
+def create_agent_executor():
+    """Returns a new agent executor and the conversation memory it uses."""
+    from langchain import hub
+    from langchain.agents import AgentExecutor, create_structured_chat_agent
+    from langchain.memory import ConversationBufferMemory
+    from langchain_core.messages import SystemMessage
+
+    tools = get_tools()
+
+    # Load the correct JSON Chat Prompt from the hub
+    prompt = hub.pull("hwchase17/structured-chat-agent")
+
+    # Create a structured Chat Agent with Conversation Buffer Memory
+    memory = ConversationBufferMemory(
+        memory_key="chat_history",
+        return_messages=True
+    )
+
+    # Create the agent with better error handling
+    agent = create_structured_chat_agent(
+        llm=get_llm(),
+        tools=tools,
+        prompt=prompt
+    )
+
+    # AgentExecutor with improved configuration
+    agent_executor = AgentExecutor.from_agent_and_tools(
+        agent=agent,
+        tools=tools,
+        verbose=True,
+        memory=memory,
+        handle_parsing_errors=True,
+        max_iterations=2,
+        early_stopping_method="generate",
+        return_intermediate_steps=False
+    )
+
+    # SystemMessage is used to define a message from the system to the agent, setting initial instructions or context
+    memory.chat_memory.add_message(SystemMessage(content=initial_message))
+    return agent_executor, memory
+
+
+def main():
+    from langchain_core.messages import AIMessage, HumanMessage
+
+    # Set up logging
+    logging.basicConfig(level=logging.INFO)
+
+    agent_executor, memory = create_agent_executor()
+
+    # Chat Loop to interact with the user
+    while True:
         try:
-            response = agent_executor.invoke({
-                "input": user_input,
-                "chat_history": memory.chat_memory.messages
-            })
-            bot_response = response["output"]
-            
-            # Log the bot response
-            logger.info(f"Bot response: {bot_response}")
-            
-            print("Bot:", bot_response)
-
-            # Add the agent's response to the conversation memory
-            memory.chat_memory.add_message(AIMessage(content=bot_response))
+            user_input = input("User: ")
+            if user_input.lower() in ["exit", "quit", "bye"]:
+                print("Bot: Goodbye!")
+                break
+
+            # Add the user's message to the conversation memory
+            memory.chat_memory.add_message(HumanMessage(content=user_input))
+
+            # Log the user input
+            logger.info(f"User input: {user_input}")
+
+            # Invoke the agent with the user input and the current chat history
+            try:
+                response = agent_executor.invoke({
+                    "input": user_input,
+                    "chat_history": memory.chat_memory.messages
+                })
+                bot_response = response["output"]
+
+                # Log the bot response
+                logger.info(f"Bot response: {bot_response}")
+
+                print("Bot:", bot_response)
+
+                # Add the agent's response to the conversation memory
+                memory.chat_memory.add_message(AIMessage(content=bot_response))
+            except Exception as e:
+                error_message = f"I encountered an error while processing your request. Let me try to answer directly: {str(e)}"
+                logger.error(error_message)
+
+                # Try to use Wikipedia directly if the agent fails
+                if "ambedkar" in user_input.lower():
+                    wiki_response = wikipedia_search_function()("Dr. B.R. Ambedkar")
+                    print("Bot:", wiki_response)
+                    memory.chat_memory.add_message(AIMessage(content=wiki_response))
+                else:
+                    print(f"Bot: {error_message}")
+        except KeyboardInterrupt:
+            print("\nBot: Session terminated by user.")
+            break
         except Exception as e:
-            error_message = f"I encountered an error while processing your request. Let me try to answer directly: {str(e)}"
+            error_message = f"An error occurred: {str(e)}"
             logger.error(error_message)
-            
-            # Try to use Wikipedia directly if the agent fails
-            if "ambedkar" in user_input.lower():
-                wiki_response = search_wikipedia("Dr. B.R. Ambedkar")
-                print("Bot:", wiki_response)
-                memory.chat_memory.add_message(AIMessage(content=wiki_response))
-            else:
-                print(f"Bot: {error_message}")
-    except KeyboardInterrupt:
-        print("\nBot: Session terminated by user.")
-        break
-    except Exception as e:
-        error_message = f"An error occurred: {str(e)}"
-        logger.error(error_message)
-        print(f"Bot: {error_message}. Please try again.")
+            print(f"Bot: {error_message}. Please try again.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+import argparse
+import os
+import subprocess
+import sys
+
+# Measures the cold import of every entry point with `python -X importtime`
+# and fails if any of them exceeds the budget:
+#
+#   python bench_import_time.py --budget-ms 100
+#
+# Each entry point is loaded in a fresh interpreter the way running it as a
+# script would set up sys.path, but without calling main(). The budget covers
+# everything the module does at import time; the -X importtime breakdown of
+# the modules it imports shows where that time went.
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+ENTRY_POINTS = [
+    "1_Chat_models/deepseek_learning_ai.py",
+    "2_prompts/2_prompt_template_with_chat_model.py",
+    "3_Chains/1_chain_basic.py",
+    "3_Chains/3_chain_branching.py",
+    "4_RAG/Rag_basic.py",
+    "4_RAG/Rag_basic_metadata.py",
+    "4_RAG/Rag_conversational.py",
+    "4_RAG/Rag_metadata_filter_query.py",
+    "4_RAG/Rag_web_scrape_basic.py",
+    "5_Ai_agents&tools/1_tool_constructor.py",
+    "5_Ai_agents&tools/basic_ai-agent.py",
+    "ai_agent_deep.py",
+    "hugging_face_learning_ai.py",
+]
+DEFAULT_BUDGET_MS = 100
+MARKER = "-- entry point --"
+
+# File names like "basic_ai-agent.py" aren't valid module names, so load them by path
+LOADER = f"""
+import importlib.util
+import os
+import sys
+import time
+
+path = sys.argv[1]
+sys.path.insert(0, os.path.dirname(path))
+spec = importlib.util.spec_from_file_location("entry_point", path)
+module = importlib.util.module_from_spec(spec)
+sys.stderr.write({MARKER!r} + "\\n")
+sys.stderr.flush()
+start = time.perf_counter()
+spec.loader.exec_module(module)
+print((time.perf_counter() - start) * 1e6)
+"""
+
+
+def parse_importtime(stderr):
+    """Returns [(module, cumulative microseconds)] for the top-level imports after the marker."""
+    lines = stderr.splitlines()
+    if MARKER not in lines:
+        return []
+    imports = []
+    for line in lines[lines.index(MARKER) + 1:]:
+        if not line.startswith("import time:"):
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # Nested imports are indented below the module that triggered them
+        name = name[1:]
+        if not name.startswith(" "):
+            imports.append((name, int(cumulative)))
+    return imports
+
+
+def measure(entry_point):
+    """Returns (imports, module execution microseconds, error) for one cold import."""
+    path = os.path.join(ROOT, entry_point)
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", LOADER, path],
+        cwd=os.path.dirname(path), capture_output=True, text=True,
+        # An input() prompt at import time fails instead of waiting for an answer
+        env={**os.environ, "PYTHONDONTWRITEBYTECODE": "1"}, stdin=subprocess.DEVNULL,
+    )
+    imports = parse_importtime(result.stderr)
+    if result.returncode != 0:
+        error = [line for line in result.stderr.splitlines() if line and not line.startswith("import time:")]
+        return imports, None, error[-1] if error else f"exit code {result.returncode}"
+    return imports, float(result.stdout.strip().splitlines()[-1]), None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check the cold import time of the entry points")
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS)
+    parser.add_argument("--top", type=int, default=3, help="Heaviest imports to show per entry point")
+    parser.add_argument("entry_points", nargs="*", default=ENTRY_POINTS)
+    args = parser.parse_args()
+
+    failures = 0
+    print(f"{'entry point':<48} {'imports ms':>10} {'module ms':>10}  heaviest imports")
+    for entry_point in args.entry_points:
+        imports, module_us, error = measure(entry_point)
+        import_ms = sum(cumulative for _, cumulative in imports) / 1000
+        heaviest = ", ".join(
+            f"{name} {cumulative / 1000:.1f}"
+            for name, cumulative in sorted(imports, key=lambda item: -item[1])[:args.top]
+        )
+        if error:
+            failures += 1
+            print(f"{entry_point:<48} {'FAILED':>10} {'':>10}  {error}")
+            continue
+        over_budget = module_us / 1000 > args.budget_ms
+        failures += over_budget
+        print(
+            f"{entry_point:<48} {import_ms:>10.1f} {module_us / 1000:>10.1f}  {heaviest}"
+            + ("  OVER BUDGET" if over_budget else "")
+        )
+
+    if failures:
+        print(f"\n{failures} entry point(s) failed or exceeded the {args.budget_ms:.0f} ms import budget")
+        sys.exit(1)
+    print(f"\nAll entry points import within {args.budget_ms:.0f} ms")
@@ -0,0 +1,71 @@
+import argparse
+import json
+import threading
+import time
+import urllib.request
+
+from resilient_calls import ResilientCaller
+from stand_in_endpoint import make_server
+
+# Compares plain calls with ResilientCaller against the stand-in endpoint:
+#
+#   python bench_resilient_calls.py --calls 300 --slow-rate 0.05 --error-rate 0.05
+
+
+def chat_completion(url):
+    request = urllib.request.Request(
+        url,
+        data=json.dumps({"model": "stand-in", "messages": [{"role": "user", "content": "hi"}]}).encode("utf-8"),
+        headers={"Content-Type": "application/json"},
+    )
+    with urllib.request.urlopen(request, timeout=30) as response:
+        return json.loads(response.read())
+
+
+def run(label, call, calls, warmup):
+    # Warm-up calls fill the latency history the hedge delay is derived from
+    for _ in range(warmup):
+        try:
+            call()
+        except Exception:
+            pass
+
+    latencies = []
+    failures = 0
+    for _ in range(calls):
+        start = time.perf_counter()
+        try:
+            call()
+        except Exception:
+            failures += 1
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+
+    def pct(p):
+        return latencies[min(len(latencies) - 1, int(p * len(latencies)))]
+
+    print(
+        f"{label:<10} p50={pct(0.50):7.1f}ms p95={pct(0.95):7.1f}ms p99={pct(0.99):7.1f}ms "
+        f"max={latencies[-1]:7.1f}ms failures={failures}/{calls}"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark hedging and retries against the stand-in endpoint")
+    parser.add_argument("--calls", type=int, default=300)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--delay-ms", type=float, default=50)
+    parser.add_argument("--slow-rate", type=float, default=0.03)
+    parser.add_argument("--slow-ms", type=float, default=1500)
+    parser.add_argument("--error-rate", type=float, default=0.05)
+    args = parser.parse_args()
+
+    server = make_server(args.port, args.delay_ms, args.slow_rate, args.slow_ms, args.error_rate)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{args.port}/v1/chat/completions"
+
+    caller = ResilientCaller("stand-in", base_delay=0.05)
+    run("plain", lambda: chat_completion(url), args.calls, args.warmup)
+    run("resilient", lambda: caller.call(lambda: chat_completion(url)), args.calls, args.warmup)
+    server.shutdown()
@@ -0,0 +1,251 @@
+import glob
+import hashlib
+import logging
+import os
+from collections import OrderedDict
+from typing import Any, List, Optional
+
+from langchain_core.callbacks import CallbackManagerForLLMRun
+from langchain_core.language_models.llms import LLM
+from pydantic import PrivateAttr
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".kv_cache")
+
+
+def _common_prefix_length(a, b):
+    length = 0
+    for x, y in zip(a, b):
+        if x != y:
+            break
+        length += 1
+    return length
+
+
+def _crop(kv, length):
+    # Slicing returns views; generation concatenates new tokens into fresh tensors,
+    # so the cached prefix itself is never modified
+    return tuple((keys[:, :, :length], values[:, :, :length]) for keys, values in kv)
+
+
+class PrefixKVCache:
+    """Keeps the attention key/value state of recent prompts and hands out the longest shared prefix.
+
+    When two prompts share a prefix of at least min_prefix_tokens (typically a
+    system prompt or the agent's tool instructions), that prefix is also saved
+    to cache_dir so later sessions start with it already computed.
+    """
+
+    def __init__(self, max_entries=16, min_prefix_tokens=32, cache_dir=None):
+        self.max_entries = max_entries
+        self.min_prefix_tokens = min_prefix_tokens
+        self.cache_dir = cache_dir
+        self.entries = OrderedDict()
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+            self._load_persisted()
+
+    def _path(self, token_ids):
+        digest = hashlib.sha1(repr(tuple(token_ids)).encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, f"{digest}.pt")
+
+    def _load_persisted(self):
+        import torch
+
+        paths = sorted(glob.glob(os.path.join(self.cache_dir, "*.pt")), key=os.path.getmtime)
+        for path in paths[-self.max_entries:]:
+            try:
+                data = torch.load(path, weights_only=True)
+            except Exception as e:
+                logger.warning("Skipping unreadable KV cache file %s: %s", path, e)
+                continue
+            self.entries[tuple(data["tokens"])] = tuple(
+                (keys, values) for keys, values in zip(data["keys"], data["values"])
+            )
+        if self.entries:
+            logger.info("Loaded %d cached prompt prefixes from %s", len(self.entries), self.cache_dir)
+
+    def _persist(self, token_ids, kv):
+        import torch
+
+        path = self._path(token_ids)
+        if os.path.exists(path):
+            return
+        torch.save(
+            {
+                "tokens": list(token_ids),
+                "keys": [keys.contiguous() for keys, _ in kv],
+                "values": [values.contiguous() for _, values in kv],
+            },
+            path,
+        )
+        logger.info("Saved a %d-token shared prompt prefix to %s", len(token_ids), path)
+        self._prune_persisted()
+
+    def _prune_persisted(self):
+        # Only the newest max_entries files are ever loaded, so the older ones just take up disk
+        paths = sorted(glob.glob(os.path.join(self.cache_dir, "*.pt")), key=os.path.getmtime)
+        for path in paths[:-self.max_entries]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                continue
+            logger.info("Evicted cached prompt prefix %s", path)
+
+    def lookup(self, token_ids):
+        """Returns (length, kv) for the longest cached prefix of token_ids, or (0, None)."""
+        best_key, best_length = None, 0
+        for key in self.entries:
+            length = _common_prefix_length(key, token_ids)
+            if length > best_length:
+                best_key, best_length = key, length
+
+        # Leave at least one prompt token for the model to process
+        best_length = min(best_length, len(token_ids) - 1)
+        if best_key is None or best_length < self.min_prefix_tokens:
+            return 0, None
+
+        self.entries.move_to_end(best_key)
+        kv = _crop(self.entries[best_key], best_length)
+        if best_length < len(best_key):
+            # Two different prompts share this prefix, so keep it as a prefix of its own
+            prefix = tuple(token_ids[:best_length])
+            self.store(prefix, kv)
+            if self.cache_dir:
+                self._persist(prefix, kv)
+        return best_length, kv
+
+    def store(self, token_ids, kv):
+        self.entries[tuple(token_ids)] = kv
+        self.entries.move_to_end(tuple(token_ids))
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+
+class LocalLLM(LLM):
+    """Runs a small HuggingFace model on the CPU, usable wherever HuggingFaceEndpoint is.
+
+    Causal models reuse the attention state of prompt prefixes shared with
+    earlier calls, so repeated system prompts are only prefilled once.
+    Encoder-decoder models such as flan-t5 run without prefix reuse, because
+    their encoder attends in both directions and a prefix's state depends on
+    the rest of the prompt.
+    """
+
+    model_id: str
+    # Branch, tag or commit of the model repository; None loads the default branch
+    revision: Optional[str] = None
+    task: str = "text-generation"
+    max_new_tokens: int = 256
+    temperature: float = 0.7
+    do_sample: bool = False
+    top_k: int = 50
+    top_p: float = 0.95
+    repetition_penalty: float = 1.0
+    stop: Optional[List[str]] = None
+    # Dynamic int8 quantization of the linear layers, for faster CPU inference
+    quantize: bool = False
+    prefix_cache_dir: Optional[str] = DEFAULT_CACHE_DIR
+    max_cached_prefixes: int = 16
+    min_prefix_tokens: int = 32
+
+    _model: Any = PrivateAttr(default=None)
+    _tokenizer: Any = PrivateAttr(default=None)
+    _prefix_cache: Any = PrivateAttr(default=None)
+
+    @property
+    def _llm_type(self) -> str:
+        return "local_cpu"
+
+    @property
+    def is_causal(self):
+        return self.task == "text-generation"
+
+    def _load(self):
+        import torch
+        from transformers import AutoModelForCausalLM, AutoModelForSeq2SeqLM, AutoTokenizer
+
+        logger.info("Loading %s on CPU", self.model_id)
+        self._tokenizer = AutoTokenizer.from_pretrained(self.model_id, revision=self.revision)
+        model_class = AutoModelForCausalLM if self.is_causal else AutoModelForSeq2SeqLM
+        model = model_class.from_pretrained(self.model_id, revision=self.revision, torch_dtype=torch.float32)
+        model.eval()
+        if self.quantize:
+            model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        self._model = model
+
+        if self.is_causal:
+            cache_dir = None
+            if self.prefix_cache_dir:
+                # Saved attention state is only valid for the exact weights and numerics that
+                # produced it, so key it by the resolved commit, dtype and quantization too
+                commit = getattr(model.config, "_commit_hash", None) or self.revision or "main"
+                variant = f"{commit}-float32" + ("-int8" if self.quantize else "")
+                cache_dir = os.path.join(self.prefix_cache_dir, self.model_id.replace("/", "--"), variant)
+            self._prefix_cache = PrefixKVCache(
+                max_entries=self.max_cached_prefixes,
+                min_prefix_tokens=self.min_prefix_tokens,
+                cache_dir=cache_dir,
+            )
+
+    def _generation_kwargs(self):
+        kwargs = {"max_new_tokens": self.max_new_tokens, "repetition_penalty": self.repetition_penalty}
+        if self.do_sample:
+            kwargs.update(do_sample=True, temperature=self.temperature, top_k=self.top_k, top_p=self.top_p)
+        else:
+            kwargs.update(do_sample=False)
+        return kwargs
+
+    def _prefill(self, input_ids):
+        """Returns the attention state of all prompt tokens but the last, reusing a cached prefix."""
+        import torch
+        from transformers import DynamicCache
+
+        token_ids = input_ids[0].tolist()
+        cached_length, cached_kv = self._prefix_cache.lookup(token_ids)
+        past = DynamicCache.from_legacy_cache(cached_kv) if cached_kv is not None else DynamicCache()
+        logger.info("Reusing %d of %d prompt tokens from the prefix cache", cached_length, len(token_ids))
+
+        if cached_length < len(token_ids) - 1:
+            with torch.no_grad():
+                self._model(input_ids=input_ids[:, cached_length:-1], past_key_values=past, use_cache=True)
+        prompt_kv = past.to_legacy_cache()
+        self._prefix_cache.store(token_ids[:-1], prompt_kv)
+        return prompt_kv
+
+    def _call(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> str:
+        import torch
+        from transformers import DynamicCache
+
+        if self._model is None:
+            self._load()
+
+        inputs = self._tokenizer(prompt, return_tensors="pt")
+        generation_kwargs = {**self._generation_kwargs(), **kwargs}
+
+        with torch.no_grad():
+            if self.is_causal and inputs.input_ids.shape[1] > 1:
+                # generate() only runs the prompt tokens the cache doesn't cover
+                past = DynamicCache.from_legacy_cache(self._prefill(inputs.input_ids))
+                output = self._model.generate(
+                    **inputs, past_key_values=past, pad_token_id=self._tokenizer.eos_token_id, **generation_kwargs
+                )
+            else:
+                output = self._model.generate(**inputs, **generation_kwargs)
+
+        new_tokens = output[0][inputs.input_ids.shape[1]:] if self.is_causal else output[0]
+        text = self._tokenizer.decode(new_tokens, skip_special_tokens=True)
+
+        # Cut the answer at the first stop sequence, as the inference endpoint does
+        for stop_sequence in (stop or []) + (self.stop or []):
+            index = text.find(stop_sequence)
+            if index != -1:
+                text = text[:index]
+        return text
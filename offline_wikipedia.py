@@ -0,0 +1,195 @@
+import argparse
+import bz2
+import re
+import sqlite3
+import time
+import xml.etree.ElementTree as ET
+
+# Offline replacement for the live `wikipedia.summary` lookups, backed by a
+# SQLite FTS5 index built once from a MediaWiki XML dump:
+#
+#   python offline_wikipedia.py build enwiki-latest-pages-articles.xml.bz2 wikipedia.db
+#   python offline_wikipedia.py query wikipedia.db "B. R. Ambedkar"
+#
+# data/wikipedia_sample.xml is a small dump for trying it out.
+
+# Sentences kept per page; lookups return the first few of them
+STORED_SENTENCES = 10
+
+SENTENCE_BOUNDARY = re.compile(r"(?<!\w\.\w.)(?<![A-Z][a-z]\.)(?<=[.?!])\s+")
+MARKUP_PATTERNS = [
+    (re.compile(r"<!--.*?-->", re.S), ""),
+    (re.compile(r"<ref[^>/]*/>"), ""),
+    (re.compile(r"<ref[^>]*>.*?</ref>", re.S), ""),
+    (re.compile(r"\{\|.*?\|\}", re.S), ""),
+    (re.compile(r"\[\[(?:File|Image|Category):[^\[\]]*(?:\[\[[^\]]*\]\][^\[\]]*)*\]\]", re.I), ""),
+    (re.compile(r"\[\[[^\]|]*\|([^\]]*)\]\]"), r"\1"),
+    (re.compile(r"\[\[([^\]]*)\]\]"), r"\1"),
+    (re.compile(r"\[https?://[^\s\]]+ ([^\]]*)\]"), r"\1"),
+    (re.compile(r"\[https?://[^\]]*\]"), ""),
+    (re.compile(r"'{2,}"), ""),
+    (re.compile(r"<[^>]+>"), ""),
+    (re.compile(r"\(\s*[,;]?\s*\)"), ""),
+]
+INNERMOST_TEMPLATE = re.compile(r"\{\{[^{}]*\}\}")
+
+
+def _local_name(tag):
+    return tag.rsplit("}", 1)[-1]
+
+
+def lead_section(wikitext):
+    """Returns the plain text of the part of an article before its first heading."""
+    lead = re.split(r"^==", wikitext, maxsplit=1, flags=re.M)[0]
+    # Templates nest, so strip them from the inside out
+    previous = None
+    while previous != lead:
+        previous, lead = lead, INNERMOST_TEMPLATE.sub("", lead)
+    for pattern, replacement in MARKUP_PATTERNS:
+        lead = pattern.sub(replacement, lead)
+    return " ".join(lead.split())
+
+
+def split_sentences(text):
+    return [sentence for sentence in SENTENCE_BOUNDARY.split(text) if sentence]
+
+
+def iter_pages(dump_path):
+    """Yields (title, redirect target or None, wikitext) for every article in a dump."""
+    opener = bz2.open if dump_path.endswith(".bz2") else open
+    with opener(dump_path, "rb") as f:
+        root = None
+        for event, elem in ET.iterparse(f, events=("start", "end")):
+            if root is None:
+                root = elem
+            if event != "end" or _local_name(elem.tag) != "page":
+                continue
+            fields = {_local_name(child.tag): child for child in elem}
+            # Only articles (namespace 0), not talk, user or template pages
+            if fields.get("ns") is None or fields["ns"].text == "0":
+                title = fields["title"].text
+                redirect = fields.get("redirect")
+                text = ""
+                revision = fields.get("revision")
+                if revision is not None:
+                    for child in revision:
+                        if _local_name(child.tag) == "text":
+                            text = child.text or ""
+                yield title, redirect.get("title") if redirect is not None else None, text
+            # Detach the parsed pages from the root too, dumps are far too large to keep in memory
+            root.clear()
+
+
+def build_index(dump_path, db_path, batch_size=10000):
+    """Builds the SQLite full-text index of lead-section summaries from a dump."""
+    conn = sqlite3.connect(db_path)
+    conn.executescript(
+        """
+        DROP TABLE IF EXISTS pages_fts;
+        DROP TABLE IF EXISTS pages;
+        DROP TABLE IF EXISTS redirects;
+        CREATE TABLE pages (id INTEGER PRIMARY KEY, title TEXT UNIQUE COLLATE NOCASE, summary TEXT);
+        CREATE TABLE redirects (title TEXT PRIMARY KEY COLLATE NOCASE, target TEXT);
+        CREATE VIRTUAL TABLE pages_fts USING fts5(title, summary, content='pages', content_rowid='id');
+        """
+    )
+
+    start = time.perf_counter()
+    pages, redirects = [], []
+    page_count = redirect_count = 0
+
+    def flush():
+        conn.executemany("INSERT OR REPLACE INTO pages (title, summary) VALUES (?, ?)", pages)
+        conn.executemany("INSERT OR REPLACE INTO redirects (title, target) VALUES (?, ?)", redirects)
+        pages.clear()
+        redirects.clear()
+
+    for title, redirect, text in iter_pages(dump_path):
+        if redirect:
+            # Links to a section resolve to the whole page
+            redirects.append((title, redirect.split("#", 1)[0]))
+            redirect_count += 1
+        else:
+            # Precompute the summary so a lookup is a single indexed read
+            summary = " ".join(split_sentences(lead_section(text))[:STORED_SENTENCES])
+            if not summary:
+                continue
+            pages.append((title, summary))
+            page_count += 1
+        if len(pages) + len(redirects) >= batch_size:
+            flush()
+            print(f"Indexed {page_count:,} pages and {redirect_count:,} redirects")
+    flush()
+
+    conn.execute("INSERT INTO pages_fts(pages_fts) VALUES ('rebuild')")
+    conn.execute("INSERT INTO pages_fts(pages_fts) VALUES ('optimize')")
+    conn.commit()
+    conn.close()
+    print(
+        f"Indexed {page_count:,} pages and {redirect_count:,} redirects "
+        f"into {db_path} in {time.perf_counter() - start:.1f}s"
+    )
+
+
+class OfflineWikipedia:
+    """Looks up page summaries in an index built by build_index()."""
+
+    def __init__(self, db_path):
+        # Read-only, and shareable with the agent's tool threads
+        self.conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, check_same_thread=False)
+
+    def _find_page(self, query):
+        row = self.conn.execute("SELECT summary FROM pages WHERE title = ?", (query,)).fetchone()
+        if row:
+            return row[0]
+
+        row = self.conn.execute(
+            "SELECT p.summary FROM redirects r JOIN pages p ON p.title = r.target WHERE r.title = ?",
+            (query,),
+        ).fetchone()
+        if row:
+            return row[0]
+
+        # Fall back to full-text search, ranking title matches well above body matches
+        words = re.findall(r"\w+", query)
+        for operator in (" AND ", " OR "):
+            if not words:
+                break
+            match = operator.join(f'"{word}"' for word in words)
+            row = self.conn.execute(
+                "SELECT summary FROM pages_fts WHERE pages_fts MATCH ? "
+                "ORDER BY bm25(pages_fts, 10.0, 1.0) LIMIT 1",
+                (match,),
+            ).fetchone()
+            if row:
+                return row[0]
+        return None
+
+    def summary(self, query, sentences=2):
+        """Returns the first sentences of the best matching page, like wikipedia.summary()."""
+        page_summary = self._find_page(query.strip())
+        if page_summary is None:
+            raise LookupError(f'Page id "{query}" does not match any pages. Try another id!')
+        return " ".join(split_sentences(page_summary)[:sentences])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline Wikipedia summaries backed by SQLite FTS5")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build_parser = commands.add_parser("build", help="Build the index from a MediaWiki XML dump")
+    build_parser.add_argument("dump", help="Path of the .xml or .xml.bz2 dump")
+    build_parser.add_argument("db", help="Path of the SQLite index to write")
+    query_parser = commands.add_parser("query", help="Look up a summary")
+    query_parser.add_argument("db", help="Path of the SQLite index")
+    query_parser.add_argument("query", help="Search query")
+    query_parser.add_argument("--sentences", type=int, default=2)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        build_index(args.dump, args.db)
+    else:
+        wiki = OfflineWikipedia(args.db)
+        start = time.perf_counter()
+        result = wiki.summary(args.query, sentences=args.sentences)
+        print(result)
+        print(f"({(time.perf_counter() - start) * 1000:.2f} ms)")
@@ -0,0 +1,202 @@
+import logging
+import random
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_STATUS = re.compile(r"\b(429|50[0-4])\b")
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an endpoint whose circuit breaker is open."""
+
+
+def status_code_of(error):
+    """Returns the HTTP status code carried by an OpenAI, HuggingFace, requests or urllib error, if any."""
+    for candidate in (error, getattr(error, "response", None)):
+        for attribute in ("status_code", "code"):
+            code = getattr(candidate, attribute, None)
+            if isinstance(code, int) and 100 <= code < 600:
+                return code
+    return None
+
+
+def is_retryable(error):
+    """Returns True for rate limiting, server errors, timeouts and dropped connections."""
+    code = status_code_of(error)
+    if code is not None:
+        return code == 429 or 500 <= code < 600
+    name = type(error).__name__
+    if "Timeout" in name or "Connection" in name or isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    # Some clients only put the status code in the message
+    return bool(RETRYABLE_STATUS.search(str(error)))
+
+
+def retry_after_of(error):
+    """Returns the Retry-After delay in seconds the server asked for, if any."""
+    headers = getattr(getattr(error, "response", None), "headers", None) or getattr(error, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after") or headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
+
+
+class LatencyTracker:
+    """Keeps recent call latencies and derives the delay after which a call is hedged."""
+
+    def __init__(self, window=200, percentile=0.95, min_samples=20):
+        self.samples = deque(maxlen=window)
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        with self._lock:
+            self.samples.append(seconds)
+
+    def hedge_delay(self):
+        """Returns the p95 latency, or None until enough calls have been seen to know it."""
+        with self._lock:
+            # A guessed delay shorter than the endpoint's normal latency would duplicate nearly every call
+            if len(self.samples) < self.min_samples:
+                return None
+            ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(self.percentile * len(ordered)))]
+
+
+class CircuitBreaker:
+    """Stops calling an endpoint after repeated failures and lets one trial call through after a cool-down."""
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state != "closed" and time.monotonic() - self.opened_at >= self.reset_timeout:
+                # Let a single trial call find out whether the endpoint recovered. A trial
+                # that never reported back doesn't hold the circuit shut past another cool-down
+                self.state = "half_open"
+                self.opened_at = time.monotonic()
+                return True
+            return self.state == "closed"
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+
+    def record_client_error(self):
+        """Settles a trial call the endpoint answered with a non-retryable error such as a 400."""
+        with self._lock:
+            # The endpoint is up, it just rejected this request
+            if self.state == "half_open":
+                self.state = "closed"
+                self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                if self.state != "open":
+                    logger.warning("Circuit opened after %d failures", self.failures)
+                self.state = "open"
+                self.opened_at = time.monotonic()
+
+
+# One breaker and latency history per endpoint, shared by every wrapper calling it
+_breakers = {}
+_trackers = {}
+_registry_lock = threading.Lock()
+
+
+def breaker_for(endpoint):
+    with _registry_lock:
+        return _breakers.setdefault(endpoint, CircuitBreaker())
+
+
+def tracker_for(endpoint):
+    with _registry_lock:
+        return _trackers.setdefault(endpoint, LatencyTracker())
+
+
+class ResilientCaller:
+    """Calls an endpoint with p95-based hedging, jittered exponential backoff and circuit breaking."""
+
+    def __init__(self, endpoint, max_attempts=4, base_delay=0.5, max_delay=20.0, hedge=True, breaker=None, tracker=None):
+        self.endpoint = endpoint
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.hedge = hedge
+        self.breaker = breaker or breaker_for(endpoint)
+        self.tracker = tracker or tracker_for(endpoint)
+        self._pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix=f"hedge-{endpoint}")
+
+    @staticmethod
+    def _timed(fn):
+        start = time.perf_counter()
+        return fn(), time.perf_counter() - start
+
+    def _hedged_call(self, fn):
+        """Runs fn, firing a duplicate if it is slower than the p95 latency, and returns the first success."""
+        primary = self._pool.submit(self._timed, fn)
+        delay = self.tracker.hedge_delay() if self.hedge else None
+        if delay is not None:
+            done, _ = wait([primary], timeout=delay)
+        if delay is None or done:
+            result, elapsed = primary.result()
+            self.tracker.record(elapsed)
+            return result
+
+        logger.info("Hedging slow call to %s", self.endpoint)
+        pending = {primary, self._pool.submit(self._timed, fn)}
+        first_error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    # Only the winner's latency is recorded; the slower copy
+                    # finishes in the background and its result is discarded
+                    result, elapsed = future.result()
+                    self.tracker.record(elapsed)
+                    return result
+                first_error = first_error or future.exception()
+        raise first_error
+
+    def call(self, fn):
+        """Calls fn() with hedging, retrying retryable errors and honouring the endpoint's circuit breaker."""
+        for attempt in range(self.max_attempts):
+            if not self.breaker.allow():
+                raise CircuitOpenError(f"Circuit for {self.endpoint} is open, not calling it")
+            try:
+                result = self._hedged_call(fn)
+            except Exception as e:
+                if not is_retryable(e):
+                    # Client errors such as a bad API key don't count as failures, but
+                    # still settle a half-open trial so the circuit doesn't stay stuck
+                    self.breaker.record_client_error()
+                    raise
+                self.breaker.record_failure()
+                if attempt == self.max_attempts - 1:
+                    raise
+                # Full jitter keeps retrying clients from hitting the endpoint in lockstep
+                delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+                delay = max(delay, retry_after_of(e) or 0.0)
+                logger.warning(
+                    "Call to %s failed (%s), retrying in %.1fs (attempt %d/%d)",
+                    self.endpoint, e, delay, attempt + 1, self.max_attempts,
+                )
+                time.sleep(delay)
+            else:
+                self.breaker.record_success()
+                return result
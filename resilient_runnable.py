@@ -0,0 +1,18 @@
+from langchain_core.runnables import Runnable
+
+from resilient_calls import ResilientCaller
+
+
+class ResilientRunnable(Runnable):
+    """Wraps a chat model or LLM so every invoke goes through a ResilientCaller.
+
+    It can be piped, bound (e.g. with stop sequences by the agent constructors)
+    and passed anywhere the wrapped model is accepted.
+    """
+
+    def __init__(self, model, endpoint, **caller_kwargs):
+        self.model = model
+        self.caller = ResilientCaller(endpoint, **caller_kwargs)
+
+    def invoke(self, input, config=None, **kwargs):
+        return self.caller.call(lambda: self.model.invoke(input, config, **kwargs))
@@ -0,0 +1,96 @@
+import argparse
+import json
+import random
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Local stand-in for the OpenRouter and HuggingFace inference endpoints that
+# injects latency, slow outliers and errors, for exercising resilient_calls.py:
+#
+#   python stand_in_endpoint.py --port 8001 --slow-rate 0.05 --error-rate 0.05
+#   OPENROUTER_API_BASE=http://127.0.0.1:8001/v1 python 1_Chat_models/deepseek_learning_ai.py
+#
+# It answers OpenAI-style chat completions on /v1/chat/completions and
+# HuggingFace-style text generation on /models/<model name>.
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Echoes requests back in the shape the real endpoints use, after injecting delays and errors."""
+
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+    def _send_json(self, status, body, headers=None):
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        settings = self.server.settings
+
+        # A few requests are much slower than the rest, which is what dominates tail latency
+        delay = settings.delay_ms
+        if random.random() < settings.slow_rate:
+            delay = settings.slow_ms
+        time.sleep(delay / 1000)
+
+        if random.random() < settings.error_rate:
+            status = random.choice([429, 500, 503])
+            headers = {"Retry-After": "0"} if status == 429 else None
+            self._send_json(status, {"error": {"message": f"Injected {status}", "code": status}}, headers)
+            return
+
+        if self.path.rstrip("/").endswith("/chat/completions"):
+            messages = request.get("messages") or [{"content": ""}]
+            self._send_json(200, {
+                "id": f"stand-in-{time.time_ns()}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": request.get("model", "stand-in"),
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": f"Echo: {messages[-1]['content']}"},
+                    "finish_reason": "stop",
+                }],
+                "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+            })
+        elif self.path.startswith("/models/"):
+            self._send_json(200, [{"generated_text": f"Echo: {request.get('inputs', '')}"}])
+        else:
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+
+
+def make_server(port=8001, delay_ms=50, slow_rate=0.05, slow_ms=3000, error_rate=0.05, quiet=True):
+    """Creates the stand-in server; call serve_forever() on it, possibly from a thread."""
+    server = ThreadingHTTPServer(("127.0.0.1", port), StandInHandler)
+    server.daemon_threads = True
+    server.settings = argparse.Namespace(
+        delay_ms=delay_ms, slow_rate=slow_rate, slow_ms=slow_ms, error_rate=error_rate
+    )
+    server.quiet = quiet
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stand-in model endpoint with injected delays and errors")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--delay-ms", type=float, default=50, help="Latency of a normal response")
+    parser.add_argument("--slow-rate", type=float, default=0.05, help="Share of responses that are slow")
+    parser.add_argument("--slow-ms", type=float, default=3000, help="Latency of a slow response")
+    parser.add_argument("--error-rate", type=float, default=0.05, help="Share of responses that fail with 429/5xx")
+    args = parser.parse_args()
+
+    server = make_server(args.port, args.delay_ms, args.slow_rate, args.slow_ms, args.error_rate, quiet=False)
+    print(f"Stand-in endpoint listening on http://127.0.0.1:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nShutting down stand-in endpoint")
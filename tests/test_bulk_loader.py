@@ -0,0 +1,91 @@
+import os
+import sys
+
+import pytest
+
+# Make the RAG helpers importable
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "4_RAG"))
+
+pytest.importorskip("langchain_chroma")
+
+from langchain_core.documents import Document  # noqa: E402
+
+from bulk_loader import bulk_load, chunk_ids, is_store_complete  # noqa: E402
+
+
+class CountingEmbeddings:
+    """Deterministic embeddings that can fail on a given embed_documents call, like an interrupted run."""
+
+    def __init__(self, fail_on_call=None):
+        self.calls = 0
+        self.fail_on_call = fail_on_call
+
+    def embed_documents(self, texts):
+        self.calls += 1
+        if self.calls == self.fail_on_call:
+            raise RuntimeError("interrupted")
+        return [[float(len(text)), float(sum(map(ord, text)) % 97), 1.0] for text in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+def make_docs(count, prefix="chunk"):
+    return [Document(page_content=f"{prefix} {i}", metadata={"source": "test.txt"}) for i in range(count)]
+
+
+def stored_ids(db):
+    return set(db._collection.get()["ids"])
+
+
+@pytest.mark.parametrize("defer_index", [False, True])
+def test_interrupted_load_resumes_from_checkpoint(tmp_path, defer_index):
+    store = str(tmp_path / f"store_{defer_index}")
+    docs = make_docs(10)
+
+    with pytest.raises(RuntimeError):
+        bulk_load(docs, CountingEmbeddings(fail_on_call=3), store, batch_size=3, defer_index=defer_index)
+    assert not is_store_complete(store)
+
+    embeddings = CountingEmbeddings()
+    db = bulk_load(docs, embeddings, store, batch_size=3, defer_index=defer_index)
+    # The two batches embedded before the failure aren't embedded again
+    assert embeddings.calls == 2
+    assert is_store_complete(store)
+    assert stored_ids(db) == set(chunk_ids(docs))
+
+
+def test_complete_store_is_not_loaded_again(tmp_path):
+    store = str(tmp_path / "store")
+    docs = make_docs(5)
+    bulk_load(docs, CountingEmbeddings(), store, batch_size=2)
+
+    embeddings = CountingEmbeddings()
+    db = bulk_load(docs, embeddings, store, batch_size=2)
+    assert embeddings.calls == 0
+    assert stored_ids(db) == set(chunk_ids(docs))
+
+
+def test_different_documents_start_over(tmp_path):
+    store = str(tmp_path / "store")
+    with pytest.raises(RuntimeError):
+        bulk_load(make_docs(6), CountingEmbeddings(fail_on_call=2), store, batch_size=2)
+
+    new_docs = make_docs(4, prefix="other")
+    embeddings = CountingEmbeddings()
+    db = bulk_load(new_docs, embeddings, store, batch_size=2)
+    # Nothing from the interrupted run is kept in the collection
+    assert embeddings.calls == 2
+    assert stored_ids(db) == set(chunk_ids(new_docs))
+
+
+
+def test_referenced_chunks_are_stored_without_text(tmp_path):
+    store = str(tmp_path / "store")
+    docs = make_docs(2)
+    docs[0].metadata["chunk_ref"] = "file"
+    db = bulk_load(docs, CountingEmbeddings(), store)
+    stored = dict(zip(*[db._collection.get()[key] for key in ("ids", "documents")]))
+    ids = chunk_ids(docs)
+    assert stored[ids[0]] == ""
+    assert stored[ids[1]] == "chunk 1"
@@ -0,0 +1,76 @@
+import os
+import shutil
+import sys
+
+import pytest
+
+# Make the RAG helpers importable
+RAG_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "4_RAG")
+sys.path.append(RAG_DIR)
+
+pytest.importorskip("langchain_core")
+
+from langchain_core.documents import Document  # noqa: E402
+
+from chunk_store import REF_KEYS, ChunkStore  # noqa: E402
+
+
+def book_chunks(root_dir, source="odyssey.txt"):
+    """Paragraphs of a book, in file order, as the text splitter would produce them."""
+    with open(os.path.join(root_dir, "books", source), encoding="utf-8") as f:
+        paragraphs = [paragraph.strip() for paragraph in f.read().split("\n\n")]
+    return [Document(page_content=text, metadata={"source": source}) for text in paragraphs if text]
+
+
+def book_path(doc):
+    return os.path.join("books", doc.metadata["source"])
+
+
+def test_book_chunks_round_trip_through_file_ranges(tmp_path):
+    docs = book_chunks(RAG_DIR)
+    store = ChunkStore(RAG_DIR, str(tmp_path))
+    referenced = store.add(docs, path_of=book_path)
+
+    assert all(doc.metadata["chunk_ref"] == "file" for doc in referenced)
+    hydrated = ChunkStore(RAG_DIR, str(tmp_path)).hydrate(referenced)
+    assert [doc.page_content for doc in hydrated] == [doc.page_content for doc in docs]
+    assert all(doc.metadata == {"source": "odyssey.txt"} for doc in hydrated)
+
+
+def test_text_without_a_source_file_round_trips_through_blocks(tmp_path):
+    # Normalised text isn't found verbatim in the book, so it goes to the block store
+    docs = [Document(page_content=" ".join(doc.page_content.split()) + " (edited)", metadata={"source": "web"})
+            for doc in book_chunks(RAG_DIR)[:200]]
+    docs.append(Document(page_content="Ωκεανός, ünïcödé text", metadata={"source": "web"}))
+    store = ChunkStore(RAG_DIR, str(tmp_path))
+    store.block_store.block_size = 4096
+    referenced = store.add(docs, path_of=book_path)
+
+    assert all(doc.metadata["chunk_ref"] == "block" for doc in referenced)
+    assert len({doc.metadata["chunk_block_offset"] for doc in referenced}) > 1
+    hydrated = ChunkStore(RAG_DIR, str(tmp_path)).hydrate(referenced)
+    assert [doc.page_content for doc in hydrated] == [doc.page_content for doc in docs]
+    assert all(not set(REF_KEYS) & set(doc.metadata) for doc in hydrated)
+
+
+def test_documents_without_a_reference_pass_through(tmp_path):
+    doc = Document(page_content="stored in the vector store", metadata={"source": "x"})
+    assert ChunkStore(RAG_DIR, str(tmp_path)).hydrate([doc]) == [doc]
+
+
+def test_changed_source_file_is_detected(tmp_path):
+    root_dir = tmp_path / "root"
+    (root_dir / "books").mkdir(parents=True)
+    shutil.copy(os.path.join(RAG_DIR, "books", "odyssey.txt"), root_dir / "books" / "odyssey.txt")
+    docs = book_chunks(str(root_dir))[:20]
+    referenced = ChunkStore(str(root_dir), str(tmp_path / "db")).add(docs, path_of=book_path)
+
+    # Same length, different bytes: the offsets still fit but the text doesn't match
+    path = root_dir / "books" / "odyssey.txt"
+    data = bytearray(path.read_bytes())
+    ref = referenced[5].metadata
+    data[ref["chunk_offset"]] ^= 0x20
+    path.write_bytes(bytes(data))
+
+    with pytest.raises(ValueError):
+        ChunkStore(str(root_dir), str(tmp_path / "db")).hydrate(referenced)
@@ -0,0 +1,50 @@
+import os
+import sys
+
+import pytest
+
+# Make the shared helpers in the repository root importable
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+from offline_wikipedia import OfflineWikipedia, build_index  # noqa: E402
+
+SAMPLE_DUMP = os.path.join(ROOT, "data", "wikipedia_sample.xml")
+
+
+@pytest.fixture(scope="module")
+def wiki(tmp_path_factory):
+    db_path = str(tmp_path_factory.mktemp("wikipedia") / "wikipedia.db")
+    build_index(SAMPLE_DUMP, db_path)
+    return OfflineWikipedia(db_path)
+
+
+def test_exact_title_returns_two_sentences_without_markup(wiki):
+    assert wiki.summary("B. R. Ambedkar") == (
+        "Bhimrao Ramji Ambedkar (14 April 1891 – 6 December 1956) was an Indian jurist, economist, "
+        "social reformer and political leader who headed the committee drafting the Constitution of India. "
+        "He served as Law and Justice minister in the first cabinet of Jawaharlal Nehru."
+    )
+
+
+def test_title_lookup_ignores_case(wiki):
+    assert wiki.summary("b. r. ambedkar") == wiki.summary("B. R. Ambedkar")
+
+
+def test_sentence_count(wiki):
+    assert wiki.summary("Odyssey", sentences=1) == (
+        "The Odyssey is one of two major ancient Greek epic poems attributed to Homer."
+    )
+
+
+def test_redirect_resolves_to_target(wiki):
+    assert wiki.summary("Ambedkar") == wiki.summary("B. R. Ambedkar")
+
+
+def test_full_text_fallback(wiki):
+    assert wiki.summary("programming readability").startswith("Python is a high-level")
+
+
+def test_not_found(wiki):
+    with pytest.raises(LookupError):
+        wiki.summary("Zzyzx")
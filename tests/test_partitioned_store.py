@@ -0,0 +1,62 @@
+import os
+import sys
+
+import pytest
+
+# Make the RAG helpers importable
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "4_RAG"))
+
+pytest.importorskip("langchain_chroma")
+
+from partitioned_store import split_filter  # noqa: E402
+
+PARTITIONS = {"iliad.txt": None, "odyssey.txt": None, "aeneid.txt": None}
+
+
+def test_no_filter_searches_every_partition():
+    assert split_filter(None, "source", PARTITIONS) == (list(PARTITIONS), None)
+
+
+def test_equality_selects_one_partition():
+    assert split_filter({"source": "odyssey.txt"}, "source", PARTITIONS) == (["odyssey.txt"], None)
+
+
+def test_unknown_partition_selects_nothing():
+    assert split_filter({"source": "beowulf.txt"}, "source", PARTITIONS) == ([], None)
+
+
+def test_in_and_nin_on_partition_key():
+    assert split_filter(
+        {"source": {"$in": ["iliad.txt", "aeneid.txt", "beowulf.txt"]}}, "source", PARTITIONS
+    ) == (["iliad.txt", "aeneid.txt"], None)
+    assert split_filter({"source": {"$nin": ["iliad.txt"]}}, "source", PARTITIONS) == (
+        ["odyssey.txt", "aeneid.txt"], None,
+    )
+
+
+def test_other_conditions_are_left_for_the_shards():
+    assert split_filter({"source": "iliad.txt", "book": 3}, "source", PARTITIONS) == (
+        ["iliad.txt"], {"book": 3},
+    )
+
+
+def test_and_is_split_into_partitions_and_remaining_conditions():
+    metadata_filter = {"$and": [
+        {"source": {"$in": ["iliad.txt", "odyssey.txt"]}},
+        {"source": {"$ne": "iliad.txt"}},
+        {"book": {"$gte": 2}},
+        {"line": {"$lt": 100}},
+    ]}
+    assert split_filter(metadata_filter, "source", PARTITIONS) == (
+        ["odyssey.txt"], {"$and": [{"book": {"$gte": 2}}, {"line": {"$lt": 100}}]},
+    )
+
+
+def test_or_is_sent_to_every_partition_unchanged():
+    metadata_filter = {"$or": [{"source": "iliad.txt"}, {"book": 3}]}
+    assert split_filter(metadata_filter, "source", PARTITIONS) == (list(PARTITIONS), metadata_filter)
+
+
+def test_unsupported_operator_on_partition_key():
+    with pytest.raises(ValueError):
+        split_filter({"source": {"$gt": "a"}}, "source", PARTITIONS)
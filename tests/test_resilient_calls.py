@@ -0,0 +1,73 @@
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+# Make the shared helpers in the repository root importable
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from resilient_calls import CircuitBreaker, LatencyTracker, ResilientCaller  # noqa: E402
+
+
+class StatusError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+def fail_with(status_code):
+    def call():
+        raise StatusError(status_code)
+    return call
+
+
+def test_half_open_trial_settled_by_client_error():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.0)
+    caller = ResilientCaller("test", max_attempts=1, hedge=False, breaker=breaker)
+
+    with pytest.raises(StatusError):
+        caller.call(fail_with(503))
+    assert breaker.state == "open"
+
+    # The trial call reaches the endpoint, which rejects the request itself
+    with pytest.raises(StatusError):
+        caller.call(fail_with(400))
+    assert breaker.state == "closed"
+
+    assert caller.call(lambda: "ok") == "ok"
+
+
+def test_unsettled_half_open_trial_expires():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.0)
+    breaker.record_failure()
+
+    assert breaker.allow()
+    assert breaker.state == "half_open"
+    # The trial never reported back; another one is let through after the cool-down
+    assert breaker.allow()
+
+
+def test_no_hedging_until_latency_is_known():
+    calls = []
+    lock = threading.Lock()
+
+    def slow():
+        with lock:
+            calls.append(1)
+        time.sleep(0.05)
+        return "ok"
+
+    tracker = LatencyTracker(min_samples=3)
+    caller = ResilientCaller("test-hedge", breaker=CircuitBreaker(), tracker=tracker)
+
+    # With no latency history there is nothing to tell a slow call from a normal one
+    assert caller.call(slow) == "ok"
+    assert len(calls) == 1
+
+    # Enough fast calls that the slow one above is beyond the p95
+    for _ in range(30):
+        tracker.record(0.001)
+    assert caller.call(slow) == "ok"
+    assert len(calls) == 3